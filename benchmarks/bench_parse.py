@@ -0,0 +1,90 @@
+""" Micro-benchmark of Job page parsing against recorded pages.
+
+Pages come from the HTTP cache (every posting fetched by a previous crawl) or
+from a directory of saved .html files:
+
+    python -m benchmarks.bench_parse
+    python -m benchmarks.bench_parse --pages path/to/html_dir --repeat 20
+"""
+import os
+import time
+import argparse
+import tracemalloc
+
+from src.cache import HTTPCache
+from src.scraper import Job, LISTING_URL, FAST_PARSER, parse_job_page
+
+
+def load_recorded_pages(pages_dir: str = None) -> list[str]:
+    if pages_dir:
+        pages = []
+        for file_name in sorted(os.listdir(pages_dir)):
+            if file_name.endswith(".html"):
+                with open(os.path.join(pages_dir, file_name), encoding="utf-8") as file:
+                    pages.append(file.read())
+        return pages
+
+    cache = HTTPCache(offline=True)
+    # Listing pages share the striive.com prefix, postings are the ones outside the listing
+    return [
+        cache.get(url).body
+        for url in cache.urls("https://striive.com/")
+        if not url.startswith(LISTING_URL)
+    ]
+
+
+def extract_fields(html: str, fast: bool) -> None:
+    job = Job.__new__(Job)
+    job._soup, job._sections = parse_job_page(html, fast=fast)
+    job._force_complete()
+    job._get_job_status()
+    job._get_job_submitter()
+    job._get_raw_job_description()
+    job._get_raw_job_params()
+
+
+def run(pages: list[str], fast: bool, repeat: int) -> dict:
+    timings = []
+    peaks = []
+    for html in pages:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            extract_fields(html, fast)
+        timings.append((time.perf_counter() - start) / repeat)
+
+        tracemalloc.start()
+        extract_fields(html, fast)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "max_ms": 1000 * max(timings),
+        "mean_peak_kib": sum(peaks) / len(peaks) / 1024,
+        "max_peak_kib": max(peaks) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Job page parsing.")
+    parser.add_argument("--pages", help="Directory of recorded .html pages (default: the HTTP cache)")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    pages = load_recorded_pages(args.pages)
+    if not pages:
+        print("No recorded pages found. Run a search first or pass --pages.")
+        return
+
+    print(f"{len(pages)} pages, {args.repeat} runs each, fast backend: {FAST_PARSER}\n")
+    print(f"{'mode':<8}{'mean ms':>10}{'max ms':>10}{'mean peak KiB':>16}{'max peak KiB':>15}")
+    for label, fast in (("full", False), ("fast", True)):
+        result = run(pages, fast, args.repeat)
+        print(
+            f"{label:<8}{result['mean_ms']:>10.2f}{result['max_ms']:>10.2f}"
+            f"{result['mean_peak_kib']:>16.1f}{result['max_peak_kib']:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
-from src.profiles import Profile, ProfileManager, Motivation
+import os
+import json
+import logging
+
+from src.profiles import Profile, ProfileManager, Motivation, get_profile_manager
 from src.scraper import Job
 from src.utils import Agent
+from src.scheduler import INTERACTIVE, MATCHING
+from src.compact import compact_profiles
+from src.embeddings import ProfileIndex
 
 
-def motivation_letter(agent: Agent, profile: Profile, job: Job):
-    response = agent.client.chat.completions.create(
+def motivation_letter_request(profile: Profile, job: Job, use_cache: bool = False) -> dict:
+    """ Keyword arguments for Agent.complete / Agent.stream that write a motivation letter. """
+    # Letters are regenerated on request, so by default they never come from the cache
+    return dict(
+        call_site="motivation_letter",
+        job_id=job.id,
         model="gpt-4-turbo",
+        use_cache=use_cache,
+        priority=INTERACTIVE,
         messages=[
             {
                 "role": "system",
@@ -45,18 +58,23 @@ def motivation_letter(agent: Agent, profile: Profile, job: Job):
         temperature=0.1,
     )
 
-    return response.choices[0].message.content
 
+def motivation_letter(agent: Agent, profile: Profile, job: Job, use_cache: bool = False):
+    content = agent.complete(**motivation_letter_request(profile, job, use_cache))
 
-def profile_matcher(agent: Agent, profiles: ProfileManager, job: Job) -> str:
+    return content
+
+
+def stream_motivation_letter(agent: Agent, profile: Profile, job: Job, use_cache: bool = False):
+    """ Yields the letter in pieces as the model writes it. """
+    yield from agent.stream(**motivation_letter_request(profile, job, use_cache))
 
-    # print(f"\ndebug-- Available Profiles: {profiles}\n")
-    # print(f"\ndebug-- Position: {job.position}\n")
-    # print(f"\ndebug-- Description: {job.assignment.description}\n")
-    # print(f"\ndebug-- Requirements: {job.assignment.requirements}\n")
-    # print(f"\ndebug-- Skills: {job.assignment.skills}\n")
 
-    response = agent.client.chat.completions.create(
+def profile_match_request(profiles: ProfileManager, job: Job, index: ProfileIndex = None) -> dict:
+    """ Keyword arguments for Agent.complete that ask for the best matching candidates.
+    With an index, only the candidates nearest to the job are sent. """
+    candidates = index.shortlist(profiles.profiles, job) if index is not None else profiles.profiles
+    return dict(
         model="gpt-4-turbo",
         messages=[
             {
@@ -74,7 +92,7 @@ def profile_matcher(agent: Agent, profiles: ProfileManager, job: Job) -> str:
                     The job has the following preferences:\n
                     {job.assignment.preferences}\n
                     You have the following candidates:\n
-                    {str(profiles)}\n
+                    {compact_profiles(candidates)}\n
                     """,
             },
             {
@@ -85,25 +103,146 @@ def profile_matcher(agent: Agent, profiles: ProfileManager, job: Job) -> str:
         temperature=0.1,
     )
 
+
+def profile_matcher(agent: Agent, profiles: ProfileManager, job: Job, index: ProfileIndex = None) -> str:
+
+    # print(f"\ndebug-- Available Profiles: {profiles}\n")
+    # print(f"\ndebug-- Position: {job.position}\n")
+    # print(f"\ndebug-- Description: {job.assignment.description}\n")
+    # print(f"\ndebug-- Requirements: {job.assignment.requirements}\n")
+    # print(f"\ndebug-- Skills: {job.assignment.skills}\n")
+
+    content = agent.complete(
+        priority=MATCHING, call_site="profile_matcher", job_id=job.id, **profile_match_request(profiles, job, index)
+    )
+
     # print(
-    #     f"\nResponse Candidate Match for {job.position}: {response.choices[0].message.content}\n"
+    #     f"\nResponse Candidate Match for {job.position}: {content}\n"
     # )
 
-    return response.choices[0].message.content
+    return content
+
 
+# Jobs packed into one matching request; 1 matches every job on its own
+JOBS_PER_MATCH_REQUEST = int(os.getenv("MATCH_JOBS_PER_REQUEST", 8))
 
-def profile_from_names(names: str) -> Profile:
-    profiles = []
+
+def _job_summary(key: int, job: Job) -> str:
+    return (
+        f"Job {key}: {job.position}\n"
+        f"Requirements: {job.assignment.requirements}\n"
+        f"Skills: {job.assignment.skills}\n"
+        f"Preferences: {job.assignment.preferences}"
+    )
+
+
+def multi_match_request(profiles: ProfileManager, jobs: list[Job], index: ProfileIndex = None) -> tuple[dict, list[Profile]]:
+    """ Keyword arguments for Agent.complete that match several jobs against one shared
+    candidate list, and that list. With an index, the list is the union of the jobs' shortlists. """
+    if index is None:
+        candidates = list(profiles.profiles)
+    else:
+        shortlisted = {}
+        for job in jobs:
+            for profile in index.shortlist(profiles.profiles, job):
+                shortlisted.setdefault(profile.id, profile)
+        candidates = list(shortlisted.values())
+    job_summaries = "\n\n".join(_job_summary(key, job) for key, job in enumerate(jobs, start=1))
+    form = ", ".join(f'"{key}": ["Candidate name", "..."]' for key in range(1, len(jobs) + 1))
+    request = dict(
+        model="gpt-4-turbo",
+        response_format={"type": "json_object"},
+        messages=[
+            {
+                "role": "system",
+                "content": f"""
+                    You are an assistant designed to match several job openings to potential candidates at once.\n
+                    BE EXTREMELY CRITICAL IN YOUR SELECTION. ONLY MATCH CANDIDATES IF THEY HAVE REQUIRED SKILLS.\n
+                    FOR EACH JOB, SELECT THE BEST MATCHING CANDIDATES (UP TO A MAXIMUM OF 3), OR NONE.\n
+                    The jobs are the following:\n
+                    {job_summaries}\n
+                    You have the following candidates:\n
+                    {compact_profiles(candidates)}\n
+                    RETURN A SINGLE JSON OBJECT WITH THE CANDIDATE NAMES PER JOB NUMBER, EXACTLY OF THE FORM:
+                    {{{form}}}\n
+                    """,
+            },
+            {
+                "role": "user",
+                "content": "Return the best matching candidates of every job. Use an empty list for a job no candidate fulfills. Return only the JSON object.",
+            },
+        ],
+        temperature=0.1,
+    )
+    return request, candidates
+
+
+def parse_multi_match(text: str, job_count: int) -> list[list[str]]:
+    """ Candidate names per job, in job order, from a multi_match_request reply. """
+    try:
+        data = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Response is not valid JSON: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+    names = []
+    for key in range(1, job_count + 1):
+        matched = data.get(str(key)) or []
+        if isinstance(matched, str):
+            matched = matched.split(",")
+        if not isinstance(matched, list):
+            raise ValueError(f"Matches of job {key} are not a list")
+        names.append([str(name).strip() for name in matched if str(name).strip()][:3])
+    return names
+
+
+def match_jobs(agent: Agent, profiles: ProfileManager, jobs: list[Job], index: ProfileIndex = None,
+               jobs_per_request: int = JOBS_PER_MATCH_REQUEST):
+    """ Yields (job, matched profiles) for every job, asking about up to jobs_per_request
+    jobs per call. A group whose reply cannot be parsed is matched job by job. """
+    if jobs_per_request <= 1:
+        for job in jobs:
+            yield job, get_profiles_from_match(agent, profiles, job, index)
+        return
+
+    for start in range(0, len(jobs), jobs_per_request):
+        group = jobs[start:start + jobs_per_request]
+        if len(group) == 1:
+            yield group[0], get_profiles_from_match(agent, profiles, group[0], index)
+            continue
+        request, candidates = multi_match_request(profiles, group, index)
+        try:
+            names = agent.complete_validated(
+                lambda content: parse_multi_match(content, len(group)),
+                dict(request, priority=MATCHING, call_site="profile_matcher_batch"),
+            )
+        except ValueError as e:
+            logging.warning(f"Invalid multi-job match response, matching {len(group)} jobs one by one: {str(e)}")
+            for job in group:
+                yield job, get_profiles_from_match(agent, profiles, job, index)
+            continue
+
+        sent = {profile.id for profile in candidates}
+        for job, job_names in zip(group, names):
+            matched = [profile for profile in map(profiles.get_profile, job_names) if profile is not None and profile.id in sent]
+            for profile in matched:
+                profile.add_job_match(Motivation(job, ""))
+            yield job, matched
+
+
+def profile_from_names(names: str, profiles: ProfileManager = None) -> list[Profile]:
+    profiles = profiles or get_profile_manager()
+    matched = []
     for name in names.split(","):
-        profile = ProfileManager().get_profile(name)
-        if profile:
-            profiles.append(profile)
+        profile = profiles.get_profile(name)
+        if profile and profile not in matched:
+            matched.append(profile)
 
-    return profiles
+    return matched
 
-def get_profiles_from_match(agent: Agent, profiles: ProfileManager, job: Job) -> list[Profile]:
-    names = profile_matcher(agent, profiles, job)
-    profile_objs = profile_from_names(names)
+def get_profiles_from_match(agent: Agent, profiles: ProfileManager, job: Job, index: ProfileIndex = None) -> list[Profile]:
+    names = profile_matcher(agent, profiles, job, index)
+    profile_objs = profile_from_names(names, profiles)
     for profile in profile_objs:
         motivation_obj = Motivation(job, "")
         profile.add_job_match(motivation_obj)
@@ -20,15 +20,23 @@ from PySide6.QtWidgets import (
     QListWidgetItem,
     QMessageBox,
     QApplication,
+    QCheckBox,
 )
 
-from src.app.worker import Worker, MatchingWorker
+from src.app.worker import Worker, MatchingWorker, StatusRefreshWorker
 from src.app.windows import JobDetailsDialog
 from src.app.utils import CustomListWidget
 
-from src.profiles import ProfileManager
+from src.profiles import get_profile_manager
+from src.embeddings import ProfileIndex
+from src.bm25 import BM25Matcher, HYBRID, LOCAL, matching_mode
 from src.utils import Agent, get_base_path
-from src.scraper import Job
+from src.cache import LLMCache
+from src.scheduler import LLMScheduler
+from src.metrics import MetricsStore
+from src.routing import ModelRouter
+from src.compact import compaction_stats
+from src.scraper import Job, OPEN_STATUS
 from src.save import save_job_to_csv
 from src.db.db import JobDAO, CandidateDAO, MatchDAO
 
@@ -37,11 +45,17 @@ class JobApplicationGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         layout = QVBoxLayout()
-        self.agent = Agent()
+        self.agent = Agent(
+            cache=LLMCache(), scheduler=LLMScheduler(), metrics=MetricsStore(), router=ModelRouter.from_env()
+        )
         self.jobdao = JobDAO()
         self.candidatedao = CandidateDAO()
         self.matchdao = MatchDAO()
-        self.all_profiles = ProfileManager()
+        self.all_profiles = get_profile_manager(self.candidatedao)
+        self.matching_mode = matching_mode()
+        self.skill_matcher = BM25Matcher()
+        # In hybrid mode BM25 picks the shortlist the LLM chooses from
+        self.profile_index = self.skill_matcher if self.matching_mode == HYBRID else ProfileIndex.from_env(self.agent)
         for candidate in self.all_profiles.profiles:
             self.candidatedao.add_candidate(candidate)
 
@@ -64,9 +78,16 @@ class JobApplicationGUI(QMainWindow):
         self.setCentralWidget(centralWidget)
 
         self.jobInput = QLineEdit(self)
-        self.jobInput.setPlaceholderText("Enter job URL or keyword...")
+        self.jobInput.setPlaceholderText("Enter job URL or keywords (comma-separated)...")
         layout.addWidget(self.jobInput)
 
+        self.allPagesCheckbox = QCheckBox("Search all result pages", self)
+        layout.addWidget(self.allPagesCheckbox)
+
+        # Off by default: stored postings are then skipped by id without fetching them
+        self.recheckCheckbox = QCheckBox("Re-check stored postings for changes", self)
+        layout.addWidget(self.recheckCheckbox)
+
         self.searchButton = QPushButton("Start Job Search", self)
         self.searchButton.clicked.connect(self.start_search)
         layout.addWidget(self.searchButton)
@@ -105,20 +126,29 @@ class JobApplicationGUI(QMainWindow):
 
         self.exportButton = QPushButton("Export to CSV", self)
         self.matchButton = QPushButton("Match Candidates", self)
+        self.refreshStatusButton = QPushButton("Refresh Status", self)
 
         self.exportButton.clicked.connect(self.exportJobs)
         self.matchButton.clicked.connect(self.matchJobs)
+        self.refreshStatusButton.clicked.connect(self.refresh_statuses)
 
         layout.addWidget(self.exportButton)
         layout.addWidget(self.matchButton)
+        layout.addWidget(self.refreshStatusButton)
 
     def exportJobs(self):
         jobs = [self.jobList.item(i).data(Qt.UserRole) for i in range(self.jobList.count())
                 if self.jobList.item(i).checkState() == Qt.CheckState.Checked]
         if jobs:
-            for job in jobs:
-                save_job_to_csv(job) 
-            QMessageBox.information(self, "Export Complete", "Selected jobs have been exported to CSV.")
+            # Reading the fields of a job that is not enriched yet would run its LLM calls on the GUI thread
+            enriched = [job for job in jobs if getattr(job, "enriched", getattr(job, "assignment_id", None) is not None)]
+            for job in enriched:
+                save_job_to_csv(job)
+            skipped = len(jobs) - len(enriched)
+            message = "Selected jobs have been exported to CSV."
+            if skipped:
+                message += f"\n{skipped} job(s) are still being analysed and were skipped; export them once enriched."
+            QMessageBox.information(self, "Export Complete", message)
         else:
             QMessageBox.information(self, "No Selection", "Please select one or more jobs to export.")
 
@@ -127,8 +157,12 @@ class JobApplicationGUI(QMainWindow):
         self.matchButton.setText("Matching...")
         jobs = [self.jobList.item(i).data(Qt.UserRole) for i in range(self.jobList.count())
                 if self.jobList.item(i).checkState() == Qt.CheckState.Checked]
+        # Rows stored by a cancelled search have no assignment to match on until a search enriches them
+        jobs = [job for job in jobs if getattr(job, "assignment_id", True) is not None]
         if jobs:
-            self.matchingWorker = MatchingWorker(self.agent, self.all_profiles, jobs, self.jobdao, self.matchdao)
+            self.matchingWorker = MatchingWorker(
+                self.agent, self.all_profiles, jobs, self.jobdao, self.matchdao, self.profile_index, self.local_matcher
+            )
             self.matchingWorker.profiles_found.connect(self.populate_candidates)
             self.matchingWorker.completed.connect(self.on_match_complete)
             self.matchingWorker.error.connect(self.show_error)
@@ -138,6 +172,33 @@ class JobApplicationGUI(QMainWindow):
             self.matchButton.setText("Match Candidates")
             self.matchButton.setEnabled(True)
 
+    def refresh_statuses(self):
+        self.refreshStatusButton.setEnabled(False)
+        self.refreshStatusButton.setText("Refreshing...")
+        self.statusRefreshWorker = StatusRefreshWorker(self.jobdao)
+        self.statusRefreshWorker.completed.connect(self.on_statuses_refreshed)
+        self.statusRefreshWorker.error.connect(self.on_status_refresh_error)
+        self.statusRefreshWorker.start()
+
+    def on_statuses_refreshed(self, changes):
+        for i in range(self.jobList.count()):
+            item = self.jobList.item(i)
+            job = item.data(Qt.UserRole)
+            if job.id in changes:
+                job.status = changes[job.id][1]
+                item.setText(self.job_label(job))
+                # The status icon is drawn when a dialog is built, so rebuild it on next open
+                self.dialogs.pop(job.id, None)
+
+        self.refreshStatusButton.setText("Refresh Status")
+        self.refreshStatusButton.setEnabled(True)
+        self.statusLabel.setText(f"Status: {len(changes)} job status(es) changed.")
+
+    def on_status_refresh_error(self, message):
+        self.refreshStatusButton.setText("Refresh Status")
+        self.refreshStatusButton.setEnabled(True)
+        QMessageBox.critical(self, "Error", f"An error occurred while refreshing statuses:\n{message}")
+
     def on_match_complete(self, message):
         self.matchButton.setText("Match Candidates")
         self.matchButton.setEnabled(True)
@@ -148,6 +209,11 @@ class JobApplicationGUI(QMainWindow):
         dialog.populate_candidates_tab(candidates)
         print(f"Candidates updated for job {job.position} in background.")  # Optional debug
 
+    @property
+    def local_matcher(self):
+        """ The matcher that replaces the LLM, in local matching mode only. """
+        return self.skill_matcher if self.matching_mode == LOCAL else None
+
     def get_job_dialog(self, job):
         if job.id not in self.dialogs:
             self.dialogs[job.id] = JobDetailsDialog(self, job, self.candidatedao, self.matchdao)
@@ -167,9 +233,14 @@ class JobApplicationGUI(QMainWindow):
             self.statusLabel.setText("Status: Searching...")
         else:
             self.statusLabel.setText(f"Status: Searching with keyword '{self.jobInput.text()[:12]}...'")
-        self.worker = Worker(self.agent, self.jobInput.text(), self.all_profiles, self.jobdao)
+        max_pages = None if self.allPagesCheckbox.isChecked() else 1
+        self.worker = Worker(
+            self.agent, self.jobInput.text(), self.all_profiles, self.jobdao,
+            max_pages=max_pages, refresh=self.recheckCheckbox.isChecked(),
+        )
         self.worker.finished.connect(self.on_search_complete)
         self.worker.update_status.connect(self.update_status)
+        self.worker.job_enriched.connect(self.on_job_enriched)
         self.worker.canceled.connect(self.on_search_canceled)
         self.worker.start()
 
@@ -177,6 +248,9 @@ class JobApplicationGUI(QMainWindow):
         self.statusLabel.setText(f"{message}")
         self.add_job_to_list(job)
 
+    def on_job_enriched(self, message: str, job: Job):
+        self.statusLabel.setText(f"{message}")
+
     def cancel_search(self):
         if self.worker is not None:
             self.worker.stop()
@@ -216,7 +290,17 @@ class JobApplicationGUI(QMainWindow):
         self.resumeButton.setEnabled(False)
 
     def on_search_complete(self):
-        self.statusLabel.setText("Status: Search complete.")
+        stats = self.worker.stats
+        spend = ""
+        if self.worker.run_id is not None:
+            calls = self.agent.metrics.summary(self.worker.run_id)
+            spend = f" {sum(row['calls'] for row in calls)} LLM calls, ${sum(row['cost'] for row in calls):.2f}."
+        self.statusLabel.setText(
+            f"Status: Search complete. {stats.new + stats.reused} new, {stats.changed} updated, "
+            f"{stats.llm_calls_saved} LLM calls saved.{spend}"
+        )
+        logging.info(f"Model escalations: {self.agent.router.stats()}")
+        logging.info(f"Prompt compaction: {compaction_stats.summary()}")
         self.searchButton.setEnabled(True)
         self.cancelButton.setEnabled(False)
         self.pauseButton.setEnabled(False)
@@ -241,8 +325,13 @@ class JobApplicationGUI(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load jobs from database:\n{str(e)}")
 
+    def job_label(self, job):
+        if job.status == OPEN_STATUS:
+            return f"{job.position} at {job.company}"
+        return f"{job.position} at {job.company} ({job.status or 'Closed'})"
+
     def add_job_to_list(self, job):
-        item = QListWidgetItem(f"{job.position} at {job.company}")
+        item = QListWidgetItem(self.job_label(job))
         item.setData(Qt.UserRole, job)
         item.setFlags(item.flags() | Qt.ItemIsUserCheckable | Qt.ItemIsSelectable | Qt.ItemIsEnabled)
         item.setCheckState(Qt.CheckState.Unchecked)
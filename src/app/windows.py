@@ -25,7 +25,7 @@ from PySide6.QtWebEngineCore import QWebEngineSettings
 
 from src.utils import format_bulleted_list, get_base_path
 from src.app.utils import CustomListWidget
-from src.app.worker import MotivationWorker, MatchingWorker
+from src.app.worker import MotivationWorker, MatchingWorker, EnrichWorker
 from src.profiles import Profile
 from src.db.db import CandidateModel
 
@@ -58,15 +58,38 @@ class JobDetailsDialog(QDialog):
         layout = QVBoxLayout(self)
 
         # Create the tab widget
-        tabWidget = QTabWidget()
-        tabWidget.addTab(self.create_main_tab(), "Main")
-        tabWidget.addTab(self.create_calendar_tab(), "Calendar")
-        tabWidget.addTab(self.create_contact_tab(), "Contact")
-        tabWidget.addTab(self.create_assignment_tab(), "Assignment")
-        tabWidget.addTab(self.create_candidates_tab(), "Candidates")
-        self.load_matched_candidates()  
+        self.tabWidget = QTabWidget()
+        self.tabWidget.addTab(self.create_candidates_tab(), "Candidates")
+        self.load_matched_candidates()
 
-        layout.addWidget(tabWidget)
+        # Reading the details of a lazy job runs its LLM calls, so that happens off the GUI thread
+        if getattr(self.job, "enriched", True):
+            self.add_detail_tabs()
+        else:
+            self.loadingLabel = QLabel("Analysing the posting...")
+            self.loadingLabel.setAlignment(Qt.AlignCenter)
+            self.tabWidget.insertTab(0, self.loadingLabel, "Main")
+            self.tabWidget.setCurrentIndex(0)
+            self.enrichWorker = EnrichWorker(self.job)
+            self.enrichWorker.completed.connect(self.on_enriched)
+            self.enrichWorker.error.connect(self.on_enrich_error)
+            self.enrichWorker.start()
+
+        layout.addWidget(self.tabWidget)
+
+    def add_detail_tabs(self):
+        self.tabWidget.insertTab(0, self.create_main_tab(), "Main")
+        self.tabWidget.insertTab(1, self.create_calendar_tab(), "Calendar")
+        self.tabWidget.insertTab(2, self.create_contact_tab(), "Contact")
+        self.tabWidget.insertTab(3, self.create_assignment_tab(), "Assignment")
+        self.tabWidget.setCurrentIndex(0)
+
+    def on_enriched(self, job):
+        self.tabWidget.removeTab(self.tabWidget.indexOf(self.loadingLabel))
+        self.add_detail_tabs()
+
+    def on_enrich_error(self, message):
+        self.loadingLabel.setText(f"Could not analyse the posting:\n{message}")
 
     def create_text_display_widget(self, text, bulleted=False):
         """Helper to create a text display widget that handles text wrapping."""
@@ -237,7 +260,10 @@ class JobDetailsDialog(QDialog):
     def match_candidates(self):
         self.matchCandidatesButton.setEnabled(False)
         self.matchCandidatesButton.setText("Matching Candidates...")
-        self.matchingWorker = MatchingWorker(self.agent, self.par.all_profiles, [self.job], self.par.jobdao, self.matchdao)
+        self.matchingWorker = MatchingWorker(
+            self.agent, self.par.all_profiles, [self.job], self.par.jobdao, self.matchdao,
+            self.par.profile_index, self.par.local_matcher,
+        )
         self.matchingWorker.profiles_found.connect(self.par.populate_candidates)
         self.matchingWorker.completed.connect(self.on_match_complete)
         self.matchingWorker.error.connect(self.show_error)
@@ -260,10 +286,17 @@ class JobDetailsDialog(QDialog):
                         if self.candidateList.item(i).checkState() == Qt.CheckState.Checked]
         
         self.motivationWorker = MotivationWorker(self.agent, self.job, candidates, self.matchdao)
+        self.motivationWorker.partial.connect(self.on_motivation_partial)
         self.motivationWorker.completed.connect(self.on_motivation_completed)
         self.motivationWorker.error.connect(self.on_motivation_error)
         self.motivationWorker.start()
 
+    def on_motivation_partial(self, candidate_id, text):
+        # Only dialogs that are already open follow the letter as it is written
+        dialog = self.candidate_dialogs.get(candidate_id)
+        if dialog:
+            dialog.motivationWidget.setText(text)
+
     def on_motivation_completed(self, message):
         candidates = [self.candidateList.item(i).data(Qt.UserRole) for i in range(self.candidateList.count())]
         # self.populate_motivations_tab(candidates)
@@ -414,17 +447,22 @@ class CandidateDetailsDialog(QDialog):
         candidates = [self.candidate]
         
         self.motivationWorker = MotivationWorker(self.parent.agent, self.parent.job, candidates, self.parent.matchdao)
+        self.motivationWorker.partial.connect(self.on_motivation_partial)
         self.motivationWorker.completed.connect(self.on_motivation_completed)
         self.motivationWorker.error.connect(self.on_motivation_error)
         self.motivationWorker.start()
 
+    def on_motivation_partial(self, candidate_id, text):
+        if candidate_id == self.id:
+            self.motivationWidget.setText(text)
+
     def on_motivation_completed(self, message):
+        # The streamed letter is already on screen; show the stored copy
         if isinstance(self.candidate, Profile):
             motivation = self.candidate.get_job_match(self.parent_id)[1]
         elif isinstance(self.candidate, CandidateModel):
             motivation = self.parent.matchdao.get_motivation(self.parent.job.id, self.candidate.id)
         self.motivationWidget.setText(motivation)
-        QMessageBox.information(self, "Success", message)
         self.createMotivationButton.setText("Recreate Motivation Letter")
         self.createMotivationButton.setEnabled(True)
 
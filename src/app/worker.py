@@ -1,26 +1,36 @@
 import re
+import time
 import traceback
 
 from PySide6.QtCore import QObject, QThread, Signal
 from threading import Event
 
 
-from src.scraper import get_jobs, Job
+from src.fetcher import get_rate_limiter, set_rate_limiter
+from src.scraper import get_jobs, enrich_jobs, refresh_statuses, Job, CrawlStats, DEFAULT_WORKERS
 from src.profiles import Motivation, Profile, create_profile_from_candidate
-from src.agent import get_profiles_from_match, motivation_letter
+from src.agent import match_jobs, stream_motivation_letter
 from src.db.db import JobDAO, CandidateDAO, MatchDAO, CandidateModel
 
 
 class Worker(QThread):
     finished = Signal(list)
     update_status = Signal(str, object)
+    job_enriched = Signal(str, object)
     paused = Signal(bool)
     canceled = Signal()  # Define the canceled signal
 
-    def __init__(self, agent, input_text, all_profiles, dao: JobDAO):
+    def __init__(self, agent, input_text, all_profiles, dao: JobDAO, workers: int = DEFAULT_WORKERS, max_pages: int = 1, lazy: bool = True, refresh: bool = False, rate_limiter=None):
         super().__init__()
         self.agent = agent
         self.input_text = input_text
+        self.workers = workers
+        self.max_pages = max_pages  # None crawls every results page
+        self.lazy = lazy  # List jobs as soon as they are scraped, enrich them afterwards
+        self.refresh = refresh  # Re-check stored postings, re-enriching only changed ones; off skips them by id
+        self.stats = CrawlStats()
+        self.run_id = None  # Metrics run of this search, when the agent records metrics
+        self.rate_limiter = rate_limiter  # Per-run politeness settings; None keeps the shared limiter
         self.all_profiles = all_profiles
         self.dao = dao # Inject the JobDAO
         self._is_running = True
@@ -28,6 +38,22 @@ class Worker(QThread):
         self._pause_event.set()  # Start unpaused
 
     def run(self):
+        # The run's limiter replaces the shared one only for the length of this search
+        previous_limiter = get_rate_limiter()
+        if self.rate_limiter is not None:
+            set_rate_limiter(self.rate_limiter)
+        try:
+            with self.agent.owned_by(self):
+                self._search()
+        finally:
+            if self.rate_limiter is not None:
+                set_rate_limiter(previous_limiter)
+            self.agent.end_run(self)
+            self.agent.reset_owner(self)  # A cancelled search no longer holds its scheduler entry
+
+    def _search(self):
+        self.run_id = self.agent.start_run(self, f"search: {self.input_text}")
+
         if re.match(r'https?://', self.input_text):
             # Input is a URL, process as a single job directly
             job = Job(self.agent, url=self.input_text)  # Assuming the Job constructor can handle URL directly
@@ -37,19 +63,56 @@ class Worker(QThread):
 
         else:
             # Process as a search term through get_jobs
-            jobs_generator = get_jobs(self.agent, self.dao, self.input_text)
+            # Comma-separated keywords are searched together in one run
+            queries = [query.strip() for query in self.input_text.split(",") if query.strip()]
+            jobs_generator = get_jobs(
+                self.agent, self.dao, queries or None,
+                workers=self.workers, max_pages=self.max_pages, lazy=self.lazy,
+                refresh=self.refresh, stats=self.stats,
+            )
+            # Listed jobs are enriched a chunk at a time while the crawl goes on, so only
+            # one chunk waits in memory and results arrive before the last page is read
+            chunk_size = self.agent.max_in_flight * 2
+            found_jobs = []
             for job in jobs_generator:
                 self._pause_event.wait()
-                self.dao.add_job(job)
+                if self.lazy:
+                    # Listed jobs are stored right away, so a cancelled search keeps them
+                    self.dao.add_listed_job(job)
+                    found_jobs.append(job)
+                else:
+                    self.dao.add_job(job)
                 if not self._is_running:
+                    jobs_generator.close()  # Stops any job fetches still queued
                     self.canceled.emit()
                     return
 
                 self.update_status.emit(f'Found: {job.position} at {job.company}', job)
+                if len(found_jobs) >= chunk_size:
+                    if not self._enrich(found_jobs):
+                        jobs_generator.close()
+                        self.canceled.emit()
+                        return
+                    found_jobs = []
+
+            if not self._enrich(found_jobs):
+                self.canceled.emit()
+                return
+            self.finished.emit([])  # Emit empty list if running but no specific job handling required
+
+    def _enrich(self, jobs: list[Job]) -> bool:
+        """ Enriches and stores a chunk of listed jobs; False once the search was cancelled. """
+        # Jobs are stored once enriched; one already opened in the GUI is not enriched twice
+        enriched_generator = enrich_jobs(jobs, owner=self)
+        for job in enriched_generator:
+            self._pause_event.wait()
+            self.dao.add_job(job)
+            if not self._is_running:
+                enriched_generator.close()
+                return False
 
-            if self._is_running:
-                self.finished.emit([])  # Emit empty list if running but no specific job handling required
-
+            self.job_enriched.emit(f'Enriched: {job.position} at {job.company}', job)
+        return self._is_running
 
     def pause(self):
         self._pause_event.clear()
@@ -61,26 +124,78 @@ class Worker(QThread):
 
     def stop(self):
         self._is_running = False
+        self.agent.cancel_pending(self)  # Drop enrichment calls waiting for, or yet to ask for, a slot
         self.resume()  # Resume to allow the thread to exit
 
+class EnrichWorker(QThread):
+    completed = Signal(object)
+    error = Signal(str)
+
+    def __init__(self, job: Job):
+        super().__init__()
+        self.job = job
+
+    def run(self):
+        try:
+            self.completed.emit(self.job.enrich())
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class StatusRefreshWorker(QThread):
+    completed = Signal(dict)  # {job_id: (old_status, new_status)} for jobs that changed
+    error = Signal(str)
+
+    def __init__(self, dao: JobDAO, workers: int = DEFAULT_WORKERS):
+        super().__init__()
+        self.dao = dao
+        self.workers = workers
+
+    def run(self):
+        try:
+            self.completed.emit(refresh_statuses(self.dao, self.workers))
+        except Exception as e:
+            self.error.emit(str(e))
+
+
 class MatchingWorker(QThread):
     profiles_found = Signal(list, object)
     completed = Signal(str)
     error = Signal(str)
 
-    def __init__(self, agent, profiles, jobs: list[Job], jobdao: JobDAO, matchdao: MatchDAO):
+    def __init__(self, agent, profiles, jobs: list[Job], jobdao: JobDAO, matchdao: MatchDAO, index=None, matcher=None):
         super().__init__()
         self.agent = agent
         self.profiles = profiles
+        self.index = index  # Optional ProfileIndex (or BM25Matcher) shortlisting the candidates of each job
+        self.matcher = matcher  # Optional BM25Matcher that replaces the LLM altogether
         self.jobs = jobs
         self.jobdao = jobdao
         self.matchdao = matchdao
 
     def run(self):
+        # Its own run, so matching during a search never takes over the search's calls
+        self.agent.start_run(self, f"matching: {len(self.jobs)} jobs")
         try:
-            for job in self.jobs:
-                print(f"Matching for {job.position} at {job.company}")
-                candidates = get_profiles_from_match(self.agent, self.profiles, job)
+            with self.agent.owned_by(self):
+                self._match()
+        finally:
+            self.agent.end_run(self)
+
+    def _match(self):
+        try:
+            # Picks up edits to candidates.csv without reading it again per match
+            self.profiles.reload_if_changed()
+            if self.matcher is not None:
+                # Every job is scored in one pass before any result is reported
+                matches = zip(self.jobs, self.matcher.match(self.profiles.profiles, self.jobs))
+            else:
+                # Several jobs per request; results still arrive, and are emitted, job by job
+                matches = match_jobs(self.agent, self.profiles, self.jobs, self.index)
+            for job, candidates in matches:
+                if self.matcher is not None:
+                    for candidate in candidates:
+                        candidate.add_job_match(Motivation(job, ""))
                 for candidate in candidates:
                     self.matchdao.add_match(job.id, candidate.id, "")
                 self.profiles_found.emit(candidates, job)
@@ -90,9 +205,14 @@ class MatchingWorker(QThread):
             self.error.emit(str(e))
 
 
+# Minimum seconds between partial letter updates sent to the GUI
+PARTIAL_INTERVAL = 0.05
+
+
 class MotivationWorker(QThread):
     completed = Signal(str)  # Signal to indicate completion with a message
     error = Signal(str)  # Signal to indicate an error with a message
+    partial = Signal(str, str)  # Candidate id and the letter written so far
 
     def __init__(self, agent, job, candidates: list[Profile], matchdao: MatchDAO):
         super().__init__()
@@ -110,11 +230,22 @@ class MotivationWorker(QThread):
             for candidate in self.candidates:
                 if isinstance(candidate, CandidateModel):
                     candidate = create_profile_from_candidate(candidate)
-                new_motivation = motivation_letter(self.agent, candidate, self.job)
+                new_motivation = self._stream_letter(candidate)
                 motivation_obj = Motivation(self.job, new_motivation)
                 candidate.update_motivation(motivation_obj)
                 self.matchdao.update_motivation(self.job.id, candidate.id, motivation_obj.motivation)
 
             self.completed.emit("Success: Motivation letters created successfully.")
         except Exception as e:
-            self.error.emit(f"Error: {str(e)}")
\ No newline at end of file
+            self.error.emit(f"Error: {str(e)}")
+
+    def _stream_letter(self, candidate) -> str:
+        letter = ""
+        last_emit = 0.0
+        for piece in stream_motivation_letter(self.agent, candidate, self.job):
+            letter += piece
+            if time.monotonic() - last_emit >= PARTIAL_INTERVAL:
+                self.partial.emit(candidate.id, letter)
+                last_emit = time.monotonic()
+        self.partial.emit(candidate.id, letter)
+        return letter
\ No newline at end of file
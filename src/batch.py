@@ -0,0 +1,246 @@
+""" Batch API mode for large backlogs: the enrichment and matching prompts of many
+jobs are written to one JSONL file, submitted to the OpenAI Batch API and applied
+to jobs.db once the batch completes. Every request is tracked by its custom_id in
+the batch_requests table, so polling and applying again never double-writes.
+
+    python -m src.batch enrich python "data engineer" --all-pages
+    python -m src.batch match
+    python -m src.batch poll --wait
+"""
+import io
+import json
+import time
+import logging
+import argparse
+
+from dotenv import load_dotenv
+
+from src.agent import profile_match_request, profile_from_names
+from src.profiles import ProfileManager, get_profile_manager
+from src.embeddings import ProfileIndex
+from src.scraper import Job, get_jobs, OPEN_STATUS
+from src.utils import Agent
+from src.cache import LLMCache
+from src.scheduler import LLMScheduler
+from src.metrics import MetricsStore
+from src.routing import ModelRouter
+from src.db.db import JobDAO, MatchDAO, BatchDAO
+
+
+ENRICH = "enrich"
+MATCH = "match"
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+POLL_INTERVAL = 60
+
+# Agent.complete options that are not part of the chat completion body
+CALL_OPTIONS = ("use_cache", "priority", "owner", "call_site", "job_id")
+
+
+def batch_line(custom_id: str, request: dict) -> dict:
+    body = {key: value for key, value in request.items() if key not in CALL_OPTIONS}
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_output(text: str) -> dict:
+    """ Maps each custom_id of a batch output (or error) file to its reply, or None if it failed. """
+    replies = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            logging.warning(f"Batch request {result.get('custom_id')} failed: {result.get('error') or response.get('status_code')}")
+            replies[result["custom_id"]] = None
+            continue
+        replies[result["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return replies
+
+
+class BatchRunner:
+    def __init__(self, agent: Agent, job_dao: JobDAO, batch_dao: BatchDAO, match_dao: MatchDAO = None,
+                 profiles: ProfileManager = None, index: ProfileIndex = None) -> None:
+        self.agent = agent
+        self.job_dao = job_dao
+        self.batch_dao = batch_dao
+        self.match_dao = match_dao
+        self.profiles = profiles
+        self.index = index
+
+    @property
+    def client(self):
+        return self.agent.client
+
+    def enrichment_requests(self, jobs: list[Job]) -> list[tuple[dict, dict]]:
+        """ One extraction request per lazy job that is not enriched or already queued. """
+        pending = self.batch_dao.pending_ids()
+        entries = []
+        for job in jobs:
+            custom_id = f"{ENRICH}-{job.id}-{job.fingerprint[:16]}"
+            if job.enriched or custom_id in pending:
+                continue
+            record = dict(
+                custom_id=custom_id, kind=ENRICH, job_id=job.id, url=job.url,
+                position=job.position, company=job.company, fingerprint=job.fingerprint,
+            )
+            entries.append((record, job.enrichment_request()))
+        return entries
+
+    def matching_requests(self, job_models=None) -> list[tuple[dict, dict]]:
+        """ One matching request per stored open job that has no matches yet. """
+        if job_models is None:
+            job_models = self.job_dao.list_jobs_by_status(OPEN_STATUS)
+        pending = self.batch_dao.pending_ids()
+        matched = self.match_dao.matched_job_ids()
+        entries = []
+        for job_model in job_models:
+            custom_id = f"{MATCH}-{job_model.id}"
+            if job_model.id in matched or custom_id in pending or job_model.assignment is None:
+                continue
+            record = dict(
+                custom_id=custom_id, kind=MATCH, job_id=job_model.id, url=job_model.url,
+                position=job_model.position, company=job_model.company, fingerprint=job_model.fingerprint,
+            )
+            entries.append((record, profile_match_request(self.profiles, job_model, self.index)))
+        return entries
+
+    def submit(self, entries: list[tuple[dict, dict]]) -> str:
+        """ Uploads the requests as one batch file and returns the batch id (None if there was nothing to send). """
+        if not entries:
+            return None
+        lines = "\n".join(
+            json.dumps(batch_line(record["custom_id"], {**request, "model": self.agent.route(request.get("call_site"), request["model"])}))
+            for record, request in entries
+        )
+        batch_file = self.client.files.create(file=("batch.jsonl", io.BytesIO(lines.encode("utf-8"))), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id, endpoint=BATCH_ENDPOINT, completion_window=COMPLETION_WINDOW
+        )
+        self.batch_dao.add_requests(batch.id, [record for record, _ in entries])
+        logging.info(f"Submitted batch {batch.id} with {len(entries)} requests")
+        return batch.id
+
+    def wait(self, batch_id: str, poll_interval: float = POLL_INTERVAL, timeout: float = None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in TERMINAL_STATUSES:
+                return batch
+            if deadline is not None and time.monotonic() >= deadline:
+                return batch
+            time.sleep(poll_interval)
+
+    def results(self, batch) -> dict:
+        replies = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                replies.update(parse_output(self.client.files.content(file_id).text))
+        return replies
+
+    def apply(self, batch) -> dict:
+        """ Writes the replies of a finished batch to the database. Requests that were
+        applied before are skipped; returns the number of requests per outcome. """
+        replies = self.results(batch) if batch.status == "completed" else {}
+        outcomes = {}
+        for request in self.batch_dao.list_requests(batch.id):
+            if request.status != "pending":
+                continue
+            content = replies.get(request.custom_id)
+            if content is None:
+                status = "failed"
+            elif request.kind == ENRICH:
+                status = self._apply_enrichment(request, content)
+            else:
+                status = self._apply_match(request, content)
+            self.batch_dao.set_status(request.custom_id, status)
+            outcomes[status] = outcomes.get(status, 0) + 1
+        return outcomes
+
+    def poll(self, wait: bool = False, poll_interval: float = POLL_INTERVAL) -> dict:
+        """ Applies every pending batch that has finished; with wait=True, blocks until all have. """
+        outcomes = {}
+        for batch_id in self.batch_dao.pending_batches():
+            batch = self.wait(batch_id, poll_interval) if wait else self.client.batches.retrieve(batch_id)
+            if batch.status not in TERMINAL_STATUSES:
+                logging.info(f"Batch {batch_id} is {batch.status}")
+                continue
+            outcomes[batch_id] = self.apply(batch)
+            logging.info(f"Applied batch {batch_id}: {outcomes[batch_id]}")
+        return outcomes
+
+    def _apply_enrichment(self, request, content: str) -> str:
+        stored = self.job_dao.get_job_by_id(request.job_id)
+        if stored is not None and stored.fingerprint == request.fingerprint:
+            return "applied"
+
+        job = Job(self.agent, request.url, request.position, request.company, lazy=True)
+        # The reply describes the posting as it was at submission time
+        if job.fingerprint != request.fingerprint:
+            return "stale"
+        job.enrich(content)
+        if stored is None:
+            self.job_dao.add_job(job)
+        else:
+            self.job_dao.update_enrichment(job)
+        return "applied"
+
+    def _apply_match(self, request, content: str) -> str:
+        for profile in profile_from_names(content, self.profiles):
+            # Keep any motivation letter already written for the pair
+            if self.match_dao.get_match(request.job_id, profile.id) is None:
+                self.match_dao.add_match(request.job_id, profile.id, "")
+        return "applied"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run enrichment and matching through the OpenAI Batch API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enrich = commands.add_parser("enrich", help="Crawl the listing and submit the extraction prompts of new jobs.")
+    enrich.add_argument("queries", nargs="*", help="Search keywords (default: the whole listing)")
+    enrich.add_argument("--all-pages", action="store_true")
+    enrich.add_argument("--workers", type=int, default=4)
+
+    commands.add_parser("match", help="Submit matching prompts for stored open jobs without matches.")
+
+    poll = commands.add_parser("poll", help="Apply the results of finished batches.")
+    poll.add_argument("--wait", action="store_true", help="Block until every pending batch has finished")
+    poll.add_argument("--interval", type=float, default=POLL_INTERVAL)
+
+    args = parser.parse_args()
+    load_dotenv()
+
+    # Built like the GUI's agent: submitted prompts are routed per call site, and replies
+    # that fail validation when applied escalate a tier up
+    agent = Agent(
+        cache=LLMCache(), scheduler=LLMScheduler(), metrics=MetricsStore(), router=ModelRouter.from_env()
+    )
+    agent.metrics.start_run(f"batch {args.command}")
+    job_dao = JobDAO()
+    runner = BatchRunner(agent, job_dao, BatchDAO(), MatchDAO(), get_profile_manager(), ProfileIndex.from_env(agent))
+
+    if args.command == "enrich":
+        jobs = list(get_jobs(
+            agent, job_dao, args.queries or None, workers=args.workers,
+            max_pages=None if args.all_pages else 1, lazy=True,
+        ))
+        # Jobs that reused a stored enrichment need no prompt
+        for job in jobs:
+            if job.enriched:
+                job_dao.add_job(job)
+        batch_id = runner.submit(runner.enrichment_requests(jobs))
+    elif args.command == "match":
+        batch_id = runner.submit(runner.matching_requests())
+    else:
+        for batch_id, outcomes in runner.poll(args.wait, args.interval).items():
+            print(f"{batch_id}: {outcomes}")
+        return
+
+    print(f"Submitted batch {batch_id}" if batch_id else "Nothing to submit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import logging
+import threading
+
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from src.embeddings import tokenize
+from src.utils import get_content_fingerprint
+
+
+# How MatchingWorker matches: by LLM only, by BM25 only, or BM25 shortlisting for the LLM
+LLM = "llm"
+LOCAL = "local"
+HYBRID = "hybrid"
+MATCHING_MODES = (LLM, LOCAL, HYBRID)
+MATCHING_MODE_ENV = "MATCHING_MODE"
+
+# Profile fields scored against a job
+CANDIDATE_FIELDS = ("skills", "experience", "certificates")
+MAX_MATCHES = 3
+SHORTLIST_SIZE = 8
+# Candidates at or below this score never match. Kept low, since a skill most of a
+# small pool shares has a small idf; the skill-term overlap in match() does the filtering
+MIN_SCORE = 0.1
+
+# Dutch and English filler that says nothing about a skill; without it any candidate
+# sharing "with" or "ervaring" with a job scores above zero
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+you your we our us they their who which what into within about over after before than then also
+experience experienced knowledge years year team work working development
+de het een en van in is op te dat die voor met als zijn aan bij om ook of door naar over uit tot
+je jij jouw wij we ons onze u uw hij zij ze er dan maar nog wel niet geen wordt worden heeft hebben
+kan kunnen moet moeten binnen jaar jaren ervaring kennis team werk werken ontwikkeling
+""".split())
+
+
+def matching_mode() -> str:
+    mode = os.getenv(MATCHING_MODE_ENV, LLM)
+    if mode not in MATCHING_MODES:
+        logging.error(f"Unknown {MATCHING_MODE_ENV} {mode}, matching with the LLM")
+        return LLM
+    return mode
+
+
+def _field(value) -> str:
+    # Empty CSV cells arrive as NaN
+    return value if isinstance(value, str) else ""
+
+
+def candidate_text(profile, fields=CANDIDATE_FIELDS) -> str:
+    return "\n".join(_field(getattr(profile, field, None)) for field in fields)
+
+
+def index_terms(text: str) -> list[str]:
+    return [term for term in tokenize(text) if term not in STOPWORDS]
+
+
+def job_skills(job) -> str:
+    return str(job.assignment.skills or "")
+
+
+def job_terms(job) -> str:
+    assignment = job.assignment
+    return "\n".join(str(part) for part in (assignment.skills, assignment.requirements) if part)
+
+
+class BM25Matcher:
+    """ Scores candidates against jobs with Okapi BM25. The candidates' term weights
+    are kept as one sparse matrix, rebuilt only when the pool changes, so scoring
+    any number of jobs is a single sparse product. """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_matches: int = MAX_MATCHES,
+                 min_score: float = MIN_SCORE, size: int = SHORTLIST_SIZE) -> None:
+        self.k1 = k1
+        self.b = b
+        self.max_matches = max_matches
+        self.min_score = min_score  # Candidates at or below it never match
+        self.size = size  # Shortlist size when used as the LLM's first pass
+        self._fingerprint = None
+        self._vocabulary = {}
+        self._weights = None  # candidates x terms
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def fit(self, profiles: list) -> None:
+        texts = [candidate_text(profile) for profile in profiles]
+        fingerprint = get_content_fingerprint("\x00".join(profile.id + text for profile, text in zip(profiles, texts)))
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            documents = [Counter(index_terms(text)) for text in texts]
+            vocabulary = {}
+            rows, columns, counts = [], [], []
+            for row, terms in enumerate(documents):
+                for term, count in terms.items():
+                    rows.append(row)
+                    columns.append(vocabulary.setdefault(term, len(vocabulary)))
+                    counts.append(count)
+            shape = (len(documents), len(vocabulary))
+            tf = sparse.csr_matrix((np.array(counts, dtype=np.float32), (rows, columns)), shape=shape)
+
+            lengths = np.asarray(tf.sum(axis=1)).ravel()
+            average = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+            df = np.bincount(tf.indices, minlength=shape[1])
+            idf = np.log1p((shape[0] - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+            # BM25 term weight per (candidate, term), computed on the stored entries only
+            norm = self.k1 * (1 - self.b + self.b * lengths / average)
+            weights = tf.copy()
+            row_norm = np.repeat(norm, np.diff(tf.indptr)).astype(np.float32)
+            weights.data = idf[tf.indices] * tf.data * (self.k1 + 1) / (tf.data + row_norm)
+
+            self._vocabulary = vocabulary
+            self._weights = weights.T.tocsr()  # terms x candidates, ready for queries @ weights
+            self._profiles = list(profiles)
+            self._fingerprint = fingerprint
+            logging.info(f"Indexed {shape[0]} candidates over {shape[1]} terms")
+
+    def _queries(self, jobs: list, text=job_terms) -> sparse.csr_matrix:
+        # Each distinct job term counts once, so long requirement lists do not dominate
+        rows, columns = [], []
+        for row, job in enumerate(jobs):
+            for term in set(index_terms(text(job))):
+                column = self._vocabulary.get(term)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=(len(jobs), len(self._vocabulary))
+        )
+
+    def scores(self, profiles: list, jobs: list) -> np.ndarray:
+        """ jobs x candidates matrix of BM25 scores, candidates in `profiles` order. """
+        self.fit(profiles)
+        with self._lock:
+            if not self._vocabulary or not jobs:
+                return np.zeros((len(jobs), len(profiles)), dtype=np.float32)
+            return (self._queries(jobs) @ self._weights).toarray()
+
+    def _top(self, scores: np.ndarray, size: int) -> list[list[int]]:
+        """ Per row, the columns of the `size` best scores above min_score, best first. """
+        size = min(size, scores.shape[1])
+        if size == 0:
+            return [[] for _ in range(scores.shape[0])]
+        top = np.argpartition(-scores, size - 1, axis=1)[:, :size]
+        ordered = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+        return [[column for column in row if row_scores[column] > self.min_score]
+                for row, row_scores in zip(ordered, scores)]
+
+    def _skill_overlap(self, jobs: list) -> np.ndarray:
+        """ jobs x candidates mask: True where the candidate has one of the job's skill terms,
+        or everywhere for a job that lists no skills. """
+        with self._lock:
+            skills = self._queries(jobs, job_skills)
+            overlap = (skills @ (self._weights != 0).astype(np.float32)).toarray() > 0
+        unlisted = np.array([[not index_terms(job_skills(job))] for job in jobs])
+        return overlap | unlisted
+
+    def match(self, profiles: list, jobs: list) -> list[list]:
+        """ The best candidates of each job (up to max_matches), without any API call.
+        A candidate has to share at least one of the job's skill terms. """
+        scores = self.scores(profiles, jobs)
+        if self._vocabulary and jobs:
+            scores = np.where(self._skill_overlap(jobs), scores, 0.0)
+        return [[profiles[column] for column in columns] for columns in self._top(scores, self.max_matches)]
+
+    def shortlist(self, profiles: list, job, size: int = None) -> list:
+        """ Same interface as ProfileIndex.shortlist, so BM25 can be the LLM's first pass. """
+        size = self.size if size is None else size
+        if not size or len(profiles) <= size:
+            return list(profiles)
+        scores = self.scores(profiles, [job])
+        return [profiles[column] for column in self._top(scores, size)[0]]
+
+    def __repr__(self) -> str:
+        return f"BM25Matcher(candidates={len(self._profiles)}, terms={len(self._vocabulary)})"
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from src.utils import get_base_path
+
+
+DEFAULT_HTTP_CACHE_BYTES = 200 * 1024 * 1024
+DEFAULT_LLM_CACHE_BYTES = 50 * 1024 * 1024
+DEFAULT_LLM_CACHE_TTL = 30 * 24 * 60 * 60
+
+
+def get_cache_path(file_name: str) -> str:
+    return os.path.join(get_base_path(), 'db', '_data', file_name)
+
+
+class CachedResponse:
+    def __init__(self, url: str, body: str, etag: str = None, last_modified: str = None) -> None:
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def __repr__(self) -> str:
+        return f"CachedResponse({self.url}, etag={self.etag}, last_modified={self.last_modified})"
+
+
+class HTTPCache:
+    """ Persistent store of page bodies and their ETag/Last-Modified validators,
+    evicted least-recently-used once the stored bodies exceed max_bytes. """
+
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_HTTP_CACHE_BYTES, offline: bool = False) -> None:
+        self._path = path or get_cache_path('http_cache.db')
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        # Offline mode serves every cached page without touching the network
+        self.offline = offline
+        self.hits = 0
+        self.stale_hits = 0  # Cached pages served because the site answered with an error
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    def get(self, url: str) -> CachedResponse:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(url, row[0], row[1], row[2])
+
+    def urls(self, prefix: str = "") -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM responses WHERE url LIKE ? ORDER BY stored_at", (f"{prefix}%",)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def store(self, url: str, body: str, etag: str = None, last_modified: str = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, len(body.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def record_hit(self, cached: CachedResponse, stale: bool = False) -> None:
+        with self._lock:
+            self.hits += 1
+            self.stale_hits += stale
+            self.bytes_saved += len(cached.body.encode("utf-8"))
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), cached.url))
+            self._conn.commit()
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "size": self.size(),
+        }
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY last_used ASC").fetchall()
+        for url, size in rows:
+            if total <= self._max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total -= size
+
+    def __repr__(self) -> str:
+        return f"HTTPCache({self.path}, hits={self.hits}, misses={self.misses})"
+
+
+class LLMCache:
+    """ Persistent store of chat completions keyed by a hash of the request, with a
+    time-to-live and least-recently-used eviction once responses exceed max_bytes. """
+
+    def __init__(self, path: str = None, ttl: float = DEFAULT_LLM_CACHE_TTL, max_bytes: int = DEFAULT_LLM_CACHE_BYTES) -> None:
+        self._path = path or get_cache_path('llm_cache.db')
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @staticmethod
+    def make_key(model: str, messages: list, temperature: float, **kwargs) -> str:
+        request = {"model": model, "messages": messages, "temperature": temperature, **kwargs}
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self._ttl is not None and now - row[1] > self._ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def store(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypasses += 1
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": self.size(),
+        }
+
+    def _evict(self) -> None:
+        if self._ttl is not None:
+            self._conn.execute("DELETE FROM completions WHERE created_at < ?", (time.time() - self._ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM completions ORDER BY last_used ASC").fetchall()
+        for key, size in rows:
+            if total <= self._max_bytes:
+                break
+            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            total -= size
+
+    def __repr__(self) -> str:
+        return f"LLMCache({self.path}, hits={self.hits}, misses={self.misses})"
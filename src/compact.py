@@ -0,0 +1,162 @@
+import os
+import re
+import math
+import logging
+import threading
+
+from src.utils import estimate_tokens
+
+
+# Token budgets per prompt part, overridable from .env
+DESCRIPTION_TOKEN_BUDGET = int(os.getenv("PROMPT_DESCRIPTION_TOKENS", 1200))
+PROFILES_TOKEN_BUDGET = int(os.getenv("PROMPT_PROFILES_TOKENS", 1500))
+
+# Profile fields the matcher judges candidates on, and the starting length of each
+MATCHING_FIELDS = ("skills", "experience", "certificates", "education")
+PROFILE_FIELD_CHARS = 400
+MIN_PROFILE_FIELD_CHARS = 40
+
+# Sentences about the application process or the agency rather than the assignment.
+# Phrases only: single words like "apply" or "acquisitie" also appear in requirements
+BOILERPLATE_PATTERNS = [
+    r"\bsollicit\w*\s+(?:\w+\s+){0,2}(?:via|voor|v[oó][oó]r|uiterlijk|nu|direct|online)\b",
+    r"\breage(?:er|ren)\s+(?:\w+\s+){0,2}(?:via|voor|v[oó][oó]r|uiterlijk|nu|direct|online)\b",
+    r"\bge[iï]nteresseerd\s*\?",
+    r"\bben je ge[iï]nteresseerd\b",
+    r"\bacquisitie\b.*\b(?:niet|geen)\b.*\bop prijs\b",
+    r"\bacquisitie naar aanleiding van\b",
+    r"\bneem\b.*\bcontact\b.*\bop\b",
+    r"\bvoor meer informatie\b",
+    r"\bprivacy ?(?:statement|verklaring|policy|beleid)\b",
+    r"\bcookie ?(?:statement|verklaring|policy|beleid)\b",
+    r"\bapply\s+(?:now|via|before|by|online|here|today|through)\b",
+    r"\binterested\s*\?",
+    r"\bif you are interested\b",
+    r"\bequal opportunit",
+    r"\blook forward to (?:your|receiving|hearing)\b",
+]
+_BOILERPLATE = re.compile("|".join(BOILERPLATE_PATTERNS), re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_LINE_BREAK = re.compile(r"[\r\n]+")
+_BULLET = re.compile(r"^\s*(?:[-•*·]|\d+[.)])\s+")
+
+# Only sentences this short are dropped as boilerplate; longer ones are mostly content
+MAX_BOILERPLATE_TOKENS = 40
+# Stripping never keeps less than this share of a description
+MIN_KEPT_SHARE = 0.5
+
+
+class CompactionStats:
+    def __init__(self) -> None:
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, before: int, after: int) -> None:
+        logging.debug(f"Compacted {kind}: {before} -> {after} tokens")
+        with self._lock:
+            counts = self._counts.setdefault(kind, {"prompts": 0, "tokens_before": 0, "tokens_after": 0})
+            counts["prompts"] += 1
+            counts["tokens_before"] += before
+            counts["tokens_after"] += after
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                kind: {**counts, "saved": 1 - counts["tokens_after"] / counts["tokens_before"] if counts["tokens_before"] else 0.0}
+                for kind, counts in self._counts.items()
+            }
+
+    def __repr__(self) -> str:
+        return f"CompactionStats({self.summary()})"
+
+
+compaction_stats = CompactionStats()
+
+
+def split_sentences(text: str) -> list[str]:
+    """ Sentences, also split at line breaks and bullets, since postings list most of
+    their content as bullet points without closing punctuation. """
+    sentences = []
+    for line in _LINE_BREAK.split(text):
+        line = _BULLET.sub("", line)
+        sentences.extend(sentence.strip() for sentence in _SENTENCE_END.split(line) if sentence.strip())
+    return sentences
+
+
+def _sentence_key(sentence: str) -> str:
+    return re.sub(r"\W+", " ", sentence.lower()).strip()
+
+
+def strip_boilerplate(text: str) -> str:
+    """ Drops short application-process sentences and repeated sentences, keeping the
+    order. Falls back to only dropping repeats when that would remove most of the text. """
+    seen = set()
+    unique = []
+    kept = []
+    for sentence in split_sentences(text):
+        key = _sentence_key(sentence)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        unique.append(sentence)
+        if _BOILERPLATE.search(sentence) and estimate_tokens(sentence) <= MAX_BOILERPLATE_TOKENS:
+            continue
+        kept.append(sentence)
+    stripped = " ".join(kept)
+    if estimate_tokens(stripped) < MIN_KEPT_SHARE * estimate_tokens(" ".join(unique)):
+        return " ".join(unique)
+    return stripped
+
+
+def fit_to_budget(text: str, budget: int) -> str:
+    """ Keeps whole sentences from the start of the text while they fit the token budget. """
+    if estimate_tokens(text) <= budget:
+        return text
+    kept = []
+    used = 0
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    if not kept:
+        # A single run-on sentence: cut it at the budget's worth of characters
+        return text[:budget * 4]
+    return " ".join(kept)
+
+
+def compact_description(text: str, budget: int = DESCRIPTION_TOKEN_BUDGET) -> str:
+    compacted = fit_to_budget(strip_boilerplate(text), budget)
+    compaction_stats.record("description", estimate_tokens(text), estimate_tokens(compacted))
+    return compacted
+
+
+def _field_text(value) -> str:
+    # Empty CSV cells arrive as NaN
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return " ".join(str(value).split())
+
+
+def compact_profile(profile, fields=MATCHING_FIELDS, field_chars: int = PROFILE_FIELD_CHARS) -> str:
+    lines = [f"Candidate: {profile.name}"]
+    for field in fields:
+        value = _field_text(getattr(profile, field, None))
+        if value:
+            lines.append(f"{field.capitalize()}: {value[:field_chars]}")
+    return "\n".join(lines)
+
+
+def compact_profiles(profiles: list, budget: int = PROFILES_TOKEN_BUDGET, fields=MATCHING_FIELDS) -> str:
+    """ The candidate pool for the matching prompt: names and matching fields only,
+    with every field shortened evenly until the pool fits the budget. """
+    before = sum(estimate_tokens(str(profile)) for profile in profiles)
+    field_chars = PROFILE_FIELD_CHARS
+    while True:
+        text = "\n\n".join(compact_profile(profile, fields, field_chars) for profile in profiles)
+        if estimate_tokens(text) <= budget or field_chars <= MIN_PROFILE_FIELD_CHARS:
+            break
+        field_chars //= 2
+    compaction_stats.record("profiles", before, estimate_tokens(text))
+    return text
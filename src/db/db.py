@@ -1,12 +1,13 @@
 import os
 import logging
 
-from sqlalchemy import Column, String, ForeignKey, create_engine
+from sqlalchemy import Column, String, ForeignKey, create_engine, inspect, text
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 
 from src.utils import get_base_path
+from src.dedup import KnownIds
 
 Base = declarative_base()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -127,6 +128,7 @@ class JobModel(Base):
     end = Column(String)
     deadline = Column(String)
     status = Column(String)
+    fingerprint = Column(String, index=True)  # Hash of the posting text the enrichment was derived from
     contact_id = Column(String, ForeignKey('contacts.id'))  # Match the data type of ContactModel.id
     submitter = relationship("ContactModel", back_populates="jobs")  # Corrected reference to ContactModel
     assignment_id = Column(String, ForeignKey('assignments.id'))  # Match the data type of AssignmentModel.id
@@ -137,8 +139,10 @@ class JobModel(Base):
 class JobDAO:
     def __init__(self):
         self.session = Session()
+        self._known_ids = None
 
     def add_job(self, job):
+        listed = False
         try:
             if self.session.is_active:
                 self.session.commit()
@@ -189,22 +193,50 @@ class JobDAO:
                         url=job.url,
                         position=job.position,
                         company=job.company,
-                        commitment=job._commitment,
+                        commitment=job.commitment,
                         start=job.start,
                         location=job.location,
                         max_hourly_rate=job.max_hourly_rate,
                         end=job.end,
                         deadline=job.deadline,
                         status=job.status,
+                        fingerprint=job.fingerprint,
                         submitter=contact,
                         assignment=assignment,
                         candidates=candidates,
                     )
                     self.session.add(job_model)
+                else:
+                    listed = job_model.assignment_id is None
+
+            # A row stored by add_listed_job() gets the enrichment now
+            if listed:
+                self.update_enrichment(job)
+
+            if self._known_ids is not None:
+                self._known_ids.add(job.id)
 
         except SQLAlchemyError as e:
             logging.error(f"Failed to add job {job.id}: {str(e)}")
 
+    def add_listed_job(self, job):
+        """ Stores what a lazy job has before enrichment: its link, title, company and
+        status. Until add_job() stores the enrichment the row has no assignment, and
+        crawls treat the job as new. """
+        try:
+            if self.session.is_active:
+                self.session.commit()
+
+            with self.session.begin():
+                if self.session.query(JobModel.id).filter_by(id=job.id).first():
+                    return
+                self.session.add(JobModel(
+                    id=job.id, url=job.url, position=job.position, company=job.company, status=job.status,
+                ))
+
+        except SQLAlchemyError as e:
+            logging.error(f"Failed to add listed job {job.id}: {str(e)}")
+
     def update_job(self, job):
         job_model = self.session.query(JobModel).filter_by(id=job.id).first()
         if job_model:
@@ -217,6 +249,7 @@ class JobDAO:
             job_model.end = job.end
             job_model.deadline = job.deadline
             job_model.status = job.status
+            job_model.fingerprint = job.fingerprint
 
             try:
                 if self.session.is_active:
@@ -260,16 +293,134 @@ class JobDAO:
             except SQLAlchemyError as e:
                 logging.error(f"Failed to update job {job.id}: {str(e)}")
 
+    def update_enrichment(self, job):
+        """ Stores a re-enriched posting: its fields, status, fingerprint and assignment.
+        The job's stored matches are kept, since a freshly scraped Job has no candidates. """
+        try:
+            if self.session.is_active:
+                self.session.commit()
+
+            with self.session.begin():
+                job_model = self.session.query(JobModel).filter_by(id=job.id).first()
+                if not job_model:
+                    return
+                job_model.position = job.position
+                job_model.company = job.company
+                job_model.commitment = job.commitment
+                job_model.start = job.start
+                job_model.location = job.location
+                job_model.max_hourly_rate = job.max_hourly_rate
+                job_model.end = job.end
+                job_model.deadline = job.deadline
+                job_model.status = job.status
+                job_model.fingerprint = job.fingerprint
+
+                if job.submitter:
+                    contact = self.session.query(ContactModel).filter_by(id=job.submitter.id).first()
+                    if not contact:
+                        contact = ContactModel(
+                            id=job.submitter.id, name=job.submitter.name,
+                            email=job.submitter.email, phone=job.submitter.phone
+                        )
+                        self.session.add(contact)
+                    job_model.submitter = contact
+
+                if job.assignment:
+                    assignment = self.session.query(AssignmentModel).filter_by(id=job.assignment.id).first()
+                    if not assignment:
+                        assignment = AssignmentModel(
+                            id=job.assignment.id, skills=job.assignment.skills,
+                            requirements=job.assignment.requirements, preferences=job.assignment.preferences
+                        )
+                        self.session.add(assignment)
+                    job_model.assignment = assignment
+
+        except SQLAlchemyError as e:
+            logging.error(f"Failed to update job {job.id}: {str(e)}")
+
     def get_job_by_id(self, job_id):
         job_model = self.session.query(JobModel).filter_by(id=job_id).first()
         if job_model:
             return job_model
 
+    def refresh_jobs(self, refreshed):
+        """ Writes {job_id: (status, fingerprint)} of re-crawled postings in one transaction. """
+        if not refreshed:
+            return
+        try:
+            if self.session.is_active:
+                self.session.commit()
+
+            with self.session.begin():
+                job_models = self.session.query(JobModel).filter(JobModel.id.in_(list(refreshed))).all()
+                for job_model in job_models:
+                    job_model.status, job_model.fingerprint = refreshed[job_model.id]
+
+        except SQLAlchemyError as e:
+            logging.error(f"Failed to refresh {len(refreshed)} jobs: {str(e)}")
+
+    def list_jobs_by_status(self, status):
+        return self.session.query(JobModel).filter_by(status=status).all()
+
+    def update_statuses(self, statuses):
+        """ Writes {job_id: status} in one transaction; returns {job_id: (old, new)} for changed rows. """
+        changes = {}
+        if not statuses:
+            return changes
+        try:
+            if self.session.is_active:
+                self.session.commit()
+
+            with self.session.begin():
+                job_models = self.session.query(JobModel).filter(JobModel.id.in_(list(statuses))).all()
+                for job_model in job_models:
+                    new_status = statuses[job_model.id]
+                    if job_model.status != new_status:
+                        changes[job_model.id] = (job_model.status, new_status)
+                        job_model.status = new_status
+
+        except SQLAlchemyError as e:
+            logging.error(f"Failed to update job statuses: {str(e)}")
+            return {}
+
+        return changes
+
+    def list_fingerprints(self):
+        # Listed jobs that were never enriched have nothing to compare against
+        return self.session.query(JobModel.id, JobModel.fingerprint).filter(JobModel.assignment_id.isnot(None)).all()
+
     def delete_job(self, job_id):
         job_model = self.session.query(JobModel).filter_by(id=job_id).first()
         if job_model:
             self.session.delete(job_model)
             self.session.commit()
+            if self._known_ids is not None:
+                self._known_ids.discard(job_id)
+
+    def known_ids(self) -> KnownIds:
+        # Loaded once; add_job and delete_job keep it current afterwards
+        if self._known_ids is None:
+            self._known_ids = KnownIds(
+                job_id for (job_id,) in self.session.query(JobModel.id).filter(JobModel.assignment_id.isnot(None))
+            )
+        return self._known_ids
+
+    def existing_ids(self, job_ids) -> set:
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        rows = self.session.query(JobModel.id).filter(
+            JobModel.id.in_(job_ids), JobModel.assignment_id.isnot(None)
+        ).all()
+        return {job_id for (job_id,) in rows}
+
+    def filter_known(self, job_ids) -> set:
+        """ Returns which of job_ids are stored, with at most one query per call. """
+        known = self.known_ids()
+        candidates = [job_id for job_id in job_ids if known.might_contain(job_id)]
+        if known.exact:
+            return set(candidates)
+        return self.existing_ids(candidates)
 
     def list_all_jobs(self):
         return self.session.query(JobModel).all()
@@ -386,10 +537,84 @@ class MatchDAO:
                 return association.motivation
             return None
 
+    def matched_job_ids(self) -> set:
+        rows = self.session.query(JobCandidateAssociation.job_id).distinct().all()
+        return {job_id for (job_id,) in rows}
+
+
+class BatchRequestModel(Base):
+    __tablename__ = 'batch_requests'
+    custom_id = Column(String, primary_key=True)  # Identifies the request inside its Batch API run
+    batch_id = Column(String, index=True)
+    kind = Column(String)
+    job_id = Column(String)
+    url = Column(String)
+    position = Column(String)
+    company = Column(String)
+    fingerprint = Column(String)
+    status = Column(String)  # pending, applied, failed or stale
+
+
+class BatchDAO:
+    def __init__(self):
+        self.session = Session()
+
+    def add_requests(self, batch_id, requests):
+        """ Records the requests of a submitted batch; resubmitted custom_ids move to the new batch. """
+        try:
+            if self.session.is_active:
+                self.session.commit()
+
+            with self.session.begin():
+                for request in requests:
+                    self.session.merge(BatchRequestModel(batch_id=batch_id, status='pending', **request))
+
+        except SQLAlchemyError as e:
+            logging.error(f"Failed to record batch {batch_id}: {str(e)}")
+
+    def pending_ids(self) -> set:
+        rows = self.session.query(BatchRequestModel.custom_id).filter_by(status='pending').all()
+        return {custom_id for (custom_id,) in rows}
+
+    def pending_batches(self) -> list:
+        rows = self.session.query(BatchRequestModel.batch_id).filter_by(status='pending').distinct().all()
+        return [batch_id for (batch_id,) in rows]
+
+    def list_requests(self, batch_id):
+        return self.session.query(BatchRequestModel).filter_by(batch_id=batch_id).all()
+
+    def set_status(self, custom_id, status):
+        request = self.session.query(BatchRequestModel).filter_by(custom_id=custom_id).first()
+        if request:
+            request.status = status
+            self.session.commit()
+
+
+# create_all only creates missing tables, so columns added to existing models are patched in here
+ADDED_COLUMNS = {
+    'jobs': {'fingerprint': 'VARCHAR'},
+}
+ADDED_INDEXES = {
+    'ix_jobs_fingerprint': ('jobs', 'fingerprint'),
+}
+
+
+def migrate(engine):
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for name, column_type in columns.items():
+                if name not in existing:
+                    connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}'))
+                    logging.info(f"Added column {table}.{name}")
+        for index, (table, column) in ADDED_INDEXES.items():
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS {index} ON {table} ({column})'))
+
 # Set up the engine and session
 engine_path = os.path.join(get_base_path(), 'db\\_data\\jobs.db')
 print(engine_path)
 engine = create_engine(f'sqlite:///{engine_path}')
 Base.metadata.create_all(engine)
+migrate(engine)
 Session = sessionmaker(bind=engine)
-
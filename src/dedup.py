@@ -0,0 +1,81 @@
+import math
+import hashlib
+
+
+# Above this many stored jobs the known-id set is replaced by a Bloom filter
+BLOOM_THRESHOLD = 50_000
+BLOOM_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE) -> None:
+        capacity = max(capacity, 1)
+        self._size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def hashes(self):
+        return self._hashes
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        # Double hashing: k positions from two independent 64-bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self._hashes):
+            yield (h1 + i * h2) % self._size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __repr__(self) -> str:
+        return f"BloomFilter(size={self.size}, hashes={self.hashes})"
+
+
+class KnownIds:
+    """ Ids already stored in the database, held as an exact set or, for big
+    catalogues, as a Bloom filter whose positives still need confirming. """
+
+    def __init__(self, ids, bloom_threshold: int = BLOOM_THRESHOLD) -> None:
+        ids = list(ids)
+        if len(ids) > bloom_threshold:
+            self._ids = None
+            # Leave room to grow before the false-positive rate degrades
+            self._bloom = BloomFilter(capacity=2 * len(ids))
+            for job_id in ids:
+                self._bloom.add(job_id)
+        else:
+            self._ids = set(ids)
+            self._bloom = None
+
+    @property
+    def exact(self) -> bool:
+        return self._ids is not None
+
+    def add(self, job_id: str) -> None:
+        if self.exact:
+            self._ids.add(job_id)
+        else:
+            self._bloom.add(job_id)
+
+    def discard(self, job_id: str) -> None:
+        # A Bloom filter cannot forget; the confirming query catches deleted ids
+        if self.exact:
+            self._ids.discard(job_id)
+
+    def might_contain(self, job_id: str) -> bool:
+        if self.exact:
+            return job_id in self._ids
+        return job_id in self._bloom
+
+    def __repr__(self) -> str:
+        return f"KnownIds(exact={self.exact})"
@@ -0,0 +1,150 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from src.compact import compact_profile
+from src.utils import CACHE_OFF, get_content_fingerprint
+
+
+# Candidates sent to the matcher per job; 0 sends the whole pool
+SHORTLIST_SIZE = 8
+SHORTLIST_ENV = "MATCH_SHORTLIST_SIZE"
+# "local" hashes words offline; "openai" calls the embeddings endpoint
+EMBEDDINGS_ENV = "EMBEDDINGS"
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+HASHING_DIMENSIONS = 1024
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+
+def tokenize(text: str) -> list[str]:
+    """ Lowercased words; names like c++, c# and node.js stay whole. """
+    return _WORD.findall(text.lower())
+
+
+class HashingEmbedder:
+    """ Fully local embeddings: word unigrams and bigrams hashed into a fixed number of
+    dimensions, log-scaled and L2-normalized. Stable across runs and machines. """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS) -> None:
+        self.dimensions = dimensions
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        # The top bit picks a sign so that colliding features tend to cancel out
+        return value % self.dimensions, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                column, sign = self._bucket(feature)
+                vectors[row, column] += sign
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        return _normalize(vectors)
+
+    def __repr__(self) -> str:
+        return f"HashingEmbedder(dimensions={self.dimensions})"
+
+
+class OpenAIEmbedder:
+    """ Embeddings from the OpenAI API, through the agent's client. """
+
+    def __init__(self, agent, model: str = OPENAI_EMBEDDING_MODEL) -> None:
+        self.agent = agent
+        self.model = model
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        response = self.agent.client.embeddings.create(model=self.model, input=texts)
+        if self.agent.metrics is not None:
+            self.agent.metrics.record("embeddings", self.model, CACHE_OFF, response.usage.prompt_tokens)
+        vectors = np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+        return _normalize(vectors)
+
+    def __repr__(self) -> str:
+        return f"OpenAIEmbedder(model={self.model})"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def profile_text(profile) -> str:
+    return compact_profile(profile)
+
+
+def job_text(job) -> str:
+    """ What a candidate is compared on: the position, its skills and its requirements. """
+    assignment = job.assignment
+    return "\n".join(str(part) for part in (job.position, assignment.skills, assignment.requirements) if part)
+
+
+class ProfileIndex:
+    """ Candidate embeddings as one matrix, a row per profile. A profile is embedded
+    again only when its matching fields change. """
+
+    def __init__(self, embedder=None, size: int = SHORTLIST_SIZE) -> None:
+        self.embedder = embedder or HashingEmbedder()
+        self.size = size
+        self._ids = []
+        self._fingerprints = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, agent=None) -> "ProfileIndex":
+        """ Local embeddings unless EMBEDDINGS=openai; MATCH_SHORTLIST_SIZE sets the shortlist size. """
+        size = int(os.getenv(SHORTLIST_ENV, SHORTLIST_SIZE))
+        embeddings = os.getenv(EMBEDDINGS_ENV, "local")
+        if embeddings == "openai" and agent is not None:
+            return cls(OpenAIEmbedder(agent), size)
+        if embeddings not in ("local", "openai"):
+            logging.error(f"Unknown {EMBEDDINGS_ENV} option {embeddings}, using local embeddings")
+        return cls(HashingEmbedder(), size)
+
+    def refresh(self, profiles: list) -> None:
+        """ Brings the matrix in line with the pool: new or changed profiles are embedded,
+        removed ones dropped. """
+        texts = {profile.id: profile_text(profile) for profile in profiles}
+        fingerprints = {profile_id: get_content_fingerprint(text) for profile_id, text in texts.items()}
+        with self._lock:
+            if fingerprints == self._fingerprints:
+                return
+            changed = [profile_id for profile_id, fingerprint in fingerprints.items()
+                       if self._fingerprints.get(profile_id) != fingerprint]
+            rows = {profile_id: self._matrix[row] for row, profile_id in enumerate(self._ids)
+                    if profile_id in fingerprints and profile_id not in changed}
+            if changed:
+                logging.info(f"Embedding {len(changed)} candidate profiles")
+                rows.update(zip(changed, self.embedder.embed([texts[profile_id] for profile_id in changed])))
+            self._ids = list(fingerprints)
+            self._matrix = np.vstack([rows[profile_id] for profile_id in self._ids]) if self._ids else None
+            self._fingerprints = fingerprints
+
+    def shortlist(self, profiles: list, job, size: int = None) -> list:
+        """ The `size` profiles nearest to the job, nearest first; the whole pool when it is
+        no larger than that. """
+        size = self.size if size is None else size
+        if not size or len(profiles) <= size:
+            return list(profiles)
+        self.refresh(profiles)
+        query = self.embedder.embed([job_text(job)])[0]
+        with self._lock:
+            scores = self._matrix @ query
+            ids = self._ids
+        size = min(size, len(ids))
+        top = np.argpartition(-scores, size - 1)[:size]
+        top = top[np.argsort(-scores[top])]
+        by_id = {profile.id: profile for profile in profiles}
+        return [by_id[ids[row]] for row in top]
+
+    def __repr__(self) -> str:
+        return f"ProfileIndex({self.embedder}, profiles={len(self._ids)}, size={self.size})"
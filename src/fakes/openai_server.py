@@ -0,0 +1,380 @@
+""" Local stand-in for the OpenAI API: chat completions (plain and streamed) and the
+Batch API (file upload, batch creation and polling, file download). Every request is
+answered by `reply`, which by default returns a deterministic, well-formed answer for
+each prompt family of the app. Chat completions take a configurable latency, and a
+share of them can fail with 500 or be rate limited with 429.
+
+    python -m src.fakes.openai_server --port 8766 --latency 0.8 --jitter 0.5 --rate-limited 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=stand-in python main.py
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 python -m src.batch poll --wait
+"""
+import re
+import math
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+API_PREFIX = "/v1"
+
+
+def _system_prompt(body: dict) -> str:
+    return next((m["content"] for m in body.get("messages", []) if m.get("role") == "system"), "")
+
+
+def _user_prompt(body: dict) -> str:
+    return next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+
+
+def _tokens(text: str) -> int:
+    # Same rough count as utils.estimate_tokens, so recorded costs stay comparable
+    return max(1, len(text) // 4)
+
+
+def _posting_parameters(prompt: str) -> dict:
+    hours = re.search(r"Uren per week\W+(\d+)", prompt)
+    return {
+        "commitment": hours.group(1) if hours else None,
+        "location": "Delft, Netherlands",
+        "max_hourly_rate": None,
+        "start_date": "01/09/2024",
+        "end_date": None,
+        "deadline": None,
+    }
+
+
+def job_details_reply(prompt: str) -> str:
+    # Only the parameters the prompt's JSON form asks for, as a model would
+    form = prompt.split("EXACTLY OF THE FORM:", 1)[-1]
+    parameters = {key: value for key, value in _posting_parameters(prompt).items() if f'"{key}"' in form}
+    return json.dumps({
+        "requirements": ["Python experience"],
+        "preferences": ["Docker"],
+        "skills": ["Python", "SQL"],
+        **parameters,
+    })
+
+
+def categorize_reply(prompt: str) -> str:
+    return "REQUIREMENTS\nPython experience\nPREFERENCES\nDocker\nSKILLS\nPython,SQL"
+
+
+def parameters_reply(prompt: str) -> str:
+    return "\n".join(f"{key}:{value or ''}" for key, value in _posting_parameters(prompt).items())
+
+
+def matching_reply(prompt: str) -> str:
+    names = re.findall(r"Candidate: (.+)", prompt)
+    if not names:
+        return "NO CANDIDATES FULLFILL JOB REQUIREMENTS"
+    return ",".join(name.strip() for name in names[:3])
+
+
+def multi_matching_reply(prompt: str) -> str:
+    jobs = re.findall(r"Job (\d+): ", prompt)
+    names = [name.strip() for name in re.findall(r"Candidate: (.+)", prompt)]
+    return json.dumps({key: names[:3] for key in jobs})
+
+
+def motivation_letter_reply(prompt: str) -> str:
+    header = re.findall(r"'((?:Subject|From): [^']+)'", prompt)
+    body = " ".join(
+        "I am writing to apply for this position, as my experience matches the skills the assignment asks for."
+        for _ in range(6)
+    )
+    return "\n".join(header + ["", "Dear hiring manager,", "", body, "", "Kind regards"])
+
+
+# Marker in the system prompt (or, for the letter, the user prompt) of each prompt family
+PROMPT_FAMILIES = [
+    ("analyse a job posting", job_details_reply),
+    ("categorize the text from a job posting", categorize_reply),
+    ("extract the parameters from a job description", parameters_reply),
+    ("match job openings", matching_reply),
+    ("match several job openings", multi_matching_reply),
+    ("motivation letter", motivation_letter_reply),
+]
+
+
+def default_reply(body: dict) -> str:
+    prompt = _system_prompt(body)
+    request = _user_prompt(body)
+    for marker, reply in PROMPT_FAMILIES:
+        if marker in prompt or marker in request:
+            return reply(prompt)
+    return "OK"
+
+
+def completion(body: dict, content: str) -> dict:
+    prompt_tokens = sum(_tokens(m.get("content") or "") for m in body.get("messages", []))
+    completion_tokens = _tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4-turbo"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def completion_chunks(body: dict, content: str):
+    """ The chat.completion.chunk objects of a streamed reply, a few words each. """
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    base = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": body.get("model", "gpt-4-turbo")}
+    yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+    for piece in re.findall(r"\S+\s*|\s+", content):
+        yield {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+    yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+
+class StandInOpenAI:
+    def __init__(
+        self,
+        reply=default_reply,
+        process_delay: float = 0.0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        piece_delay: float = 0.0,
+        failure_rate: float = 0.0,
+        rate_limited: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0,
+        port: int = 0,
+    ) -> None:
+        self.reply = reply  # body -> content, or None to fail that request
+        self.process_delay = process_delay
+        # Chat completion latency: log-normal around `latency` seconds with `jitter` as sigma
+        self.latency = latency
+        self.jitter = jitter
+        self.piece_delay = piece_delay  # Seconds between the pieces of a streamed reply
+        self.failure_rate = failure_rate  # Share of chat completions answered with 500
+        self.rate_limited = rate_limited  # Share of chat completions answered with 429
+        self.retry_after = retry_after
+
+        self.requests = 0
+        self.failed = 0
+        self.throttled = 0
+        self.families = {}
+        self._random = random.Random(seed)
+
+        self.files = {}
+        self.batches = {}
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}{API_PREFIX}"
+
+    def start(self) -> "StandInOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StandInOpenAI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def agent(self, **kwargs):
+        """ An Agent whose calls all go to this stand-in. """
+        from src.utils import Agent
+
+        return Agent(api_key="stand-in", base_url=self.url, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "failed": self.failed, "throttled": self.throttled,
+                    "families": dict(self.families)}
+
+    def _admit(self, body: dict) -> tuple[int, float]:
+        """ Returns (status, latency) for an incoming chat completion; the seeded draws
+        make a run with the same requests in the same order reproducible. """
+        with self._lock:
+            self.requests += 1
+            family = next((reply.__name__ for marker, reply in PROMPT_FAMILIES
+                           if marker in _system_prompt(body) or marker in _user_prompt(body)), "other")
+            self.families[family] = self.families.get(family, 0) + 1
+            draw = self._random.random()
+            latency = self.latency * math.exp(self._random.gauss(0, self.jitter)) if self.jitter else self.latency
+            if draw < self.rate_limited:
+                self.throttled += 1
+                return 429, 0.0
+            if draw < self.rate_limited + self.failure_rate:
+                self.failed += 1
+                return 500, latency
+            return 200, latency
+
+    def _add_file(self, filename: str, data: bytes, purpose: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self.files[file_id] = {
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed", "data": data,
+        }
+        return self.files[file_id]
+
+    def _create_batch(self, params: dict) -> dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        self.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": params["endpoint"],
+            "input_file_id": params["input_file_id"], "completion_window": params["completion_window"],
+            "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+            "error_file_id": None, "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        return self.batches[batch_id]
+
+    def _advance(self, batch: dict) -> None:
+        """ Runs the batch once its processing delay has passed. """
+        if batch["status"] != "in_progress" or time.time() - batch["created_at"] < self.process_delay:
+            return
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            content = self.reply(request["body"])
+            result = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+            if content is None:
+                errors.append({**result, "response": {"status_code": 500, "body": {}}, "error": {"message": "Injected failure"}})
+            else:
+                output.append({**result, "response": {"status_code": 200, "body": completion(request["body"], content)}, "error": None})
+
+        if output:
+            batch["output_file_id"] = self._add_file("output.jsonl", "\n".join(map(json.dumps, output)).encode("utf-8"), "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self._add_file("errors.jsonl", "\n".join(map(json.dumps, errors)).encode("utf-8"), "batch_output")["id"]
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _not_found(self):
+                self._send_json(404, {"error": {"message": f"No route for {self.path}"}})
+
+            def _chat_completion(self, body: dict):
+                status, latency = server._admit(body)
+                if status == 429:
+                    return self._send_json(
+                        429, {"error": {"message": "Injected rate limit", "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"Retry-After": f"{server.retry_after:g}"},
+                    )
+                time.sleep(latency)
+                content = server.reply(body) if status == 200 else None
+                if content is None:
+                    return self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                if not body.get("stream"):
+                    return self._send_json(200, completion(body, content))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in completion_chunks(body, content):
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(server.piece_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == f"{API_PREFIX}/chat/completions":
+                    # Outside the lock, so that slow replies overlap like they do upstream
+                    return self._chat_completion(json.loads(body))
+                with server._lock:
+                    if self.path == f"{API_PREFIX}/files":
+                        form = BytesParser(policy=default_policy).parsebytes(
+                            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+                        )
+                        fields = {part.get_param("name", header="content-disposition"): part for part in form.iter_parts()}
+                        upload = fields["file"]
+                        purpose = fields["purpose"].get_content().strip()
+                        file = server._add_file(upload.get_filename(), upload.get_payload(decode=True), purpose)
+                        return self._send_json(200, {k: v for k, v in file.items() if k != "data"})
+                    if self.path == f"{API_PREFIX}/batches":
+                        return self._send_json(200, server._create_batch(json.loads(body)))
+                self._not_found()
+
+            def do_GET(self):
+                with server._lock:
+                    match = re.fullmatch(rf"{API_PREFIX}/batches/([\w-]+)", self.path)
+                    if match and match.group(1) in server.batches:
+                        batch = server.batches[match.group(1)]
+                        server._advance(batch)
+                        return self._send_json(200, batch)
+                    match = re.fullmatch(rf"{API_PREFIX}/files/([\w-]+)/content", self.path)
+                    if match and match.group(1) in server.files:
+                        data = server.files[match.group(1)]["data"]
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/octet-stream")
+                        self.send_header("Content-Length", str(len(data)))
+                        self.end_headers()
+                        return self.wfile.write(data)
+                self._not_found()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stand-in for the OpenAI chat completions and Batch API.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--process-delay", type=float, default=0.0, help="Seconds before a batch completes")
+    parser.add_argument("--latency", type=float, default=0.0, help="Median seconds per chat completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Log-normal sigma of the latency")
+    parser.add_argument("--piece-delay", type=float, default=0.0, help="Seconds between streamed pieces")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of completions failing with 500")
+    parser.add_argument("--rate-limited", type=float, default=0.0, help="Share of completions rejected with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInOpenAI(
+        process_delay=args.process_delay, latency=args.latency, jitter=args.jitter, piece_delay=args.piece_delay,
+        failure_rate=args.failure_rate, rate_limited=args.rate_limited, retry_after=args.retry_after,
+        seed=args.seed, port=args.port,
+    )
+    print(f"Serving stand-in OpenAI API at {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(server.stats())
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+""" Local stand-in for striive.com that serves generated listing and posting pages
+and throttles like a real site: 429 with Retry-After above the request rate, 503
+above the concurrency limit, and latency that grows with load.
+
+    python -m src.fakes.striive_server --port 8765 --rate 5
+    STRIIVE_LISTING_URL=http://127.0.0.1:8765/nl/opdrachten/ python main.py
+"""
+import time
+import hashlib
+import argparse
+import threading
+
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LISTING_PATH = "/nl/opdrachten/"
+POSTING_PATH = "/nl/opdracht/"
+
+
+def render_listing(base_url: str, postings: list[int]) -> str:
+    cards = "".join(
+        f"""
+        <div class="col-md-4">
+            <a href="{base_url}{POSTING_PATH}{number}">
+                <div class="hfp_card-title hfp_ellipsize">Python Developer {number}</div>
+                <div class="hfp_card-company hfp_ellipsize">Company {number % 7}</div>
+            </a>
+        </div>"""
+        for number in postings
+    )
+    return f"<html><body><div class='row'>{cards}</div></body></html>"
+
+
+def render_posting(number: int) -> str:
+    return f"""<html><body>
+        <div class="hfp_url-segments"><span>Company {number % 7}</span><span>Python Developer {number}</span></div>
+        <div class="hfp_button hfp-button-outline-success no-transition mb-4 d-none d-sm-block"><a>Open</a></div>
+        <div id="hfp_recruiter-info-block">
+            <b>Recruiter {number % 3}</b>
+            <div class="d-none d-sm-block hfp_ellipsize"><a>recruiter{number % 3}@example.com</a><p>+31 6 0000000{number % 10}</p></div>
+        </div>
+        <div id="hfp_assignments"><div class="hfp_content">
+            Wij zoeken een Python developer voor opdracht {number}. Ervaring met Django en PostgreSQL is vereist.
+            Kennis van Docker is een pre.
+        </div></div>
+        <div id="hfp_assignment-info-block">
+            <div class="hfp_item"><p>Uren per week</p><b>{32 + number % 9}</b></div>
+            <div class="hfp_item"><p>Locatie</p><b>Delft</b></div>
+            <div class="hfp_item"><p>Startdatum</p><b>1 september 2024</b></div>
+        </div>
+    </body></html>"""
+
+
+class StandInStriive:
+    def __init__(
+        self,
+        postings: int = 40,
+        per_page: int = 12,
+        rate: float = 5.0,
+        max_concurrency: int = 4,
+        latency: float = 0.05,
+        port: int = 0,
+    ) -> None:
+        self.postings = postings
+        self.per_page = per_page
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.latency = latency
+
+        self.requests = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def listing_url(self) -> str:
+        return f"{self.url}{LISTING_PATH}"
+
+    def start(self) -> "StandInStriive":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StandInStriive":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _admit(self) -> tuple[int, int]:
+        """ Returns (status, in_flight) for an incoming request. """
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate:
+                self.throttled += 1
+                return 429, self._in_flight
+            if self._in_flight >= self.max_concurrency:
+                self.throttled += 1
+                return 503, self._in_flight
+            self._recent.append(now)
+            self._in_flight += 1
+            return 200, self._in_flight
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _page(self, path: str, query: dict) -> str:
+        if path == LISTING_PATH:
+            page = int(query.get("page", ["1"])[0])
+            first = (page - 1) * self.per_page
+            return render_listing(self.url, list(range(first, min(first + self.per_page, self.postings))))
+        if path.startswith(POSTING_PATH):
+            number = int(path[len(POSTING_PATH):].strip("/") or 0)
+            if number < self.postings:
+                return render_posting(number)
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, in_flight = server._admit()
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header("Retry-After", "1")
+                    self.end_headers()
+                    return
+                try:
+                    # Latency grows with the number of requests being served at once
+                    time.sleep(server.latency * in_flight)
+                    parsed = urlparse(self.path)
+                    body = server._page(parsed.path, parse_qs(parsed.query))
+                    if body is None:
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+
+                    etag = f'"{hashlib.md5(body.encode("utf-8")).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+
+                    data = body.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    server._release()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a throttling stand-in for striive.com.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--postings", type=int, default=40)
+    parser.add_argument("--rate", type=float, default=5.0)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = StandInStriive(args.postings, rate=args.rate, max_concurrency=args.max_concurrency,
+                            latency=args.latency, port=args.port)
+    print(f"Serving stand-in listing at {server.listing_url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
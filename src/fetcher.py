@@ -0,0 +1,133 @@
+import time
+import logging
+import threading
+
+from urllib.parse import urlparse
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from src.cache import HTTPCache
+from src.ratelimit import RateLimiter, THROTTLE_STATUSES
+
+
+DEFAULT_POOL_SIZE = 8
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 3
+
+_session = None
+_session_lock = threading.Lock()
+
+_http_cache = None
+_http_cache_enabled = True
+
+_rate_limiter = None
+_rate_limiter_enabled = True
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    session = requests.Session()
+    # Keep-alive connections are reused per host, so the pool has to be at least
+    # as large as the number of threads fetching from striive.com at once.
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+    return _session
+
+
+def get_http_cache() -> HTTPCache:
+    global _http_cache
+    with _session_lock:
+        if _http_cache is None and _http_cache_enabled:
+            _http_cache = HTTPCache()
+    return _http_cache
+
+
+def set_http_cache(cache: HTTPCache) -> None:
+    """ Replaces the shared response cache; pass None to fetch without caching. """
+    global _http_cache, _http_cache_enabled
+    with _session_lock:
+        _http_cache = cache
+        _http_cache_enabled = cache is not None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    with _session_lock:
+        if _rate_limiter is None and _rate_limiter_enabled:
+            _rate_limiter = RateLimiter(max_concurrency=DEFAULT_POOL_SIZE)
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: RateLimiter) -> None:
+    """ Replaces the shared per-host limiter, e.g. with per-run settings; None disables it. """
+    global _rate_limiter, _rate_limiter_enabled
+    with _session_lock:
+        _rate_limiter = limiter
+        _rate_limiter_enabled = limiter is not None
+
+
+def _get(session: requests.Session, url: str, headers: dict = None) -> requests.Response:
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    host_limiter = limiter.for_host(urlparse(url).netloc)
+    for attempt in range(MAX_RETRIES + 1):
+        # After a 429/503 the next slot only opens once the host's backoff has passed
+        with host_limiter.slot():
+            start = time.monotonic()
+            response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            host_limiter.record(response.status_code, time.monotonic() - start, response.headers.get("Retry-After"))
+        if response.status_code not in THROTTLE_STATUSES:
+            break
+    return response
+
+
+def fetch_html(url: str, session: requests.Session = None, strict: bool = False) -> str:
+    """ The page at url. An error response (after the throttling retries) is never
+    returned: the cached copy is served instead when there is one, and otherwise
+    requests.HTTPError is raised. strict=True always raises, for callers that need
+    the page as it is now. """
+    session = session or get_session()
+    cache = get_http_cache()
+    if cache is None:
+        response = _get(session, url)
+        response.raise_for_status()
+        return response.text
+
+    cached = cache.get(url)
+    if cached and cache.offline:
+        cache.record_hit(cached)
+        return cached.body
+
+    # A conditional GET lets the server answer 304 without resending the page
+    headers = cached.validators() if cached else {}
+    response = _get(session, url, headers)
+    if response.status_code == 304 and cached:
+        cache.record_hit(cached)
+        return cached.body
+
+    if not response.ok and cached and not strict:
+        logging.warning(f"Serving the cached copy of {url} after HTTP {response.status_code}")
+        cache.record_hit(cached, stale=True)
+        return cached.body
+
+    cache.record_miss()
+    response.raise_for_status()
+    cache.store(
+        url,
+        response.text,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    return response.text
@@ -0,0 +1,114 @@
+""" Reads the job parameters straight from the labelled fields of a posting's info
+block (hfp_assignment-info-block), so the LLM only has to fill in what is missing. """
+import re
+
+from src.utils import JOB_DETAIL_PARAMETERS
+
+
+# Label prefixes per parameter, matched against the lowercased label
+PARAMETER_LABELS = {
+    "commitment": ("uren per week", "aantal uren", "uren", "hours per week", "hours"),
+    "location": ("locatie", "standplaats", "werklocatie", "plaats", "location"),
+    "max_hourly_rate": ("maximaal uurtarief", "max. uurtarief", "max uurtarief", "uurtarief", "tarief", "hourly rate", "rate"),
+    "start_date": ("startdatum", "aanvangsdatum", "ingangsdatum", "start date", "start"),
+    "end_date": ("einddatum", "end date", "eind"),
+    "deadline": ("reageren kan t/m", "reageren kan tot", "reageren voor", "uiterste reactiedatum", "sluitingsdatum", "deadline"),
+}
+
+DUTCH_MONTHS = {
+    "jan": 1, "feb": 2, "mrt": 3, "maa": 3, "apr": 4, "mei": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "okt": 10, "nov": 11, "dec": 12,
+    # English spellings that differ from the Dutch ones
+    "mar": 3, "may": 5, "oct": 10,
+}
+
+_NUMERIC_DATE = re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{2,4})\b")
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_WRITTEN_DATE = re.compile(r"\b(\d{1,2})\s+([a-z]+)\.?\s+(\d{4})\b")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _format_date(day: int, month: int, year: int) -> str:
+    if year < 100:
+        year += 2000
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    return f"{day:02d}/{month:02d}/{year}"
+
+
+def normalize_date(value: str) -> str:
+    """ DD/MM/YYYY from '1 september 2024', '1 sept. 2024', '01-09-2024' or '2024-09-01'. """
+    value = value.lower()
+    match = _ISO_DATE.search(value)
+    if match:
+        return _format_date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+    match = _NUMERIC_DATE.search(value)
+    if match:
+        return _format_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    match = _WRITTEN_DATE.search(value)
+    if match:
+        month = DUTCH_MONTHS.get(match.group(2)[:3])
+        if month:
+            return _format_date(int(match.group(1)), month, int(match.group(3)))
+    return None
+
+
+def _numbers(value: str) -> list[float]:
+    return [float(number.replace(",", ".")) for number in _NUMBER.findall(value)]
+
+
+def _format_number(number: float) -> str:
+    return str(int(number)) if number == int(number) else f"{number:g}"
+
+
+def normalize_hours(value: str) -> str:
+    """ '36', or '32-40' for a range; None when the field holds no number. """
+    numbers = [number for number in _numbers(value) if 0 < number <= 80]
+    if not numbers:
+        return None
+    low, high = min(numbers), max(numbers)
+    return _format_number(low) if low == high else f"{_format_number(low)}-{_format_number(high)}"
+
+
+def normalize_rate(value: str) -> str:
+    """ The highest amount in EUR per hour, e.g. '€ 80,- tot € 95,-' gives '95'. """
+    # Thousands separators would otherwise split an amount in two
+    numbers = _numbers(re.sub(r"(?<=\d)\.(?=\d{3}\b)", "", value))
+    if not numbers:
+        return None
+    return _format_number(max(numbers))
+
+
+def normalize_location(value: str) -> str:
+    value = " ".join(value.split())
+    return value or None
+
+
+NORMALIZERS = {
+    "commitment": normalize_hours,
+    "location": normalize_location,
+    "max_hourly_rate": normalize_rate,
+    "start_date": normalize_date,
+    "end_date": normalize_date,
+    "deadline": normalize_date,
+}
+
+
+def parameter_for_label(label: str) -> str:
+    label = label.lower().strip().rstrip(":").strip()
+    for parameter, prefixes in PARAMETER_LABELS.items():
+        if any(label.startswith(prefix) for prefix in prefixes):
+            return parameter
+    return None
+
+
+def extract_parameters(info: dict) -> dict:
+    """ Maps the info block's {label: value} pairs onto the job parameters. Parameters
+    that are absent or could not be normalized are None. """
+    parameters = {key: None for key in JOB_DETAIL_PARAMETERS}
+    for label, value in info.items():
+        parameter = parameter_for_label(label)
+        if parameter is None or parameters[parameter] is not None or not value:
+            continue
+        parameters[parameter] = NORMALIZERS[parameter](value)
+    return parameters
@@ -0,0 +1,175 @@
+""" Local record of every LLM call: call site, job, model, tokens, latency, cache
+status and cost, grouped into runs (one search or matching session each).
+
+    python -m src.metrics                 # per call site, latest run
+    python -m src.metrics --by job        # per job, latest run
+    python -m src.metrics --by route      # per call site and model, latest run
+    python -m src.metrics --runs          # totals of every run
+"""
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+
+from src.cache import get_cache_path
+from src.utils import CACHE_HIT
+
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (5.0, 15.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+# A route is a call site together with the model that answered it, which shows escalations
+GROUP_COLUMNS = {"call_site": "call_site", "job": "job_id", "model": "model", "route": "call_site || ' > ' || model"}
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+class MetricsStore:
+    """ SQLite log of LLM calls. A call is attributed to the run passed with it; calls
+    passed without one (e.g. from the command line tools) go to the run last started. """
+
+    def __init__(self, path: str = None) -> None:
+        self._path = path or get_cache_path('metrics.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id TEXT PRIMARY KEY,
+                label TEXT,
+                started_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                run_id TEXT,
+                call_site TEXT,
+                job_id TEXT,
+                model TEXT NOT NULL,
+                cache_status TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                latency REAL NOT NULL,
+                cost REAL NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_llm_calls_run ON llm_calls (run_id);
+            """
+        )
+        self._conn.commit()
+        self._run_id = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    def start_run(self, label: str = "") -> str:
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute("INSERT INTO runs VALUES (?, ?, ?)", (run_id, label, time.time()))
+            self._conn.commit()
+            self._run_id = run_id
+        return run_id
+
+    def record(self, call_site: str, model: str, cache_status: str, prompt_tokens: int = 0,
+               completion_tokens: int = 0, latency: float = 0.0, job_id: str = None, run_id: str = None) -> None:
+        # Cache hits cost nothing, whatever the tokens of the original call were
+        cost = 0.0 if cache_status == CACHE_HIT else call_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO llm_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id or self._run_id, call_site, job_id, model, cache_status, prompt_tokens,
+                 completion_tokens, latency, cost, time.time()),
+            )
+            self._conn.commit()
+
+    def summary(self, run_id: str = None, by: str = "call_site") -> list[dict]:
+        """ Totals per call site, job or model for one run (all runs when run_id is None),
+        most expensive first. """
+        column = GROUP_COLUMNS[by]
+        query = f"""
+            SELECT {column}, COUNT(*), SUM(cache_status = ?), SUM(prompt_tokens),
+                   SUM(completion_tokens), SUM(latency), AVG(latency), SUM(cost)
+            FROM llm_calls {"WHERE run_id = ?" if run_id else ""}
+            GROUP BY {column} ORDER BY SUM(cost) DESC, SUM(prompt_tokens) DESC
+        """
+        with self._lock:
+            rows = self._conn.execute(query, (CACHE_HIT, run_id) if run_id else (CACHE_HIT,)).fetchall()
+        return [
+            {
+                by: key,
+                "calls": calls,
+                "hit_rate": hits / calls if calls else 0.0,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency": latency,
+                "mean_latency": mean_latency,
+                "cost": cost,
+            }
+            for key, calls, hits, prompt_tokens, completion_tokens, latency, mean_latency, cost in rows
+        ]
+
+    def runs(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT runs.id, runs.label, runs.started_at, COUNT(llm_calls.run_id),
+                       COALESCE(SUM(prompt_tokens + completion_tokens), 0), COALESCE(SUM(cost), 0)
+                FROM runs LEFT JOIN llm_calls ON llm_calls.run_id = runs.id
+                GROUP BY runs.id ORDER BY runs.started_at
+                """
+            ).fetchall()
+        return [
+            {"id": run_id, "label": label, "started_at": started_at, "calls": calls, "tokens": tokens, "cost": cost}
+            for run_id, label, started_at, calls, tokens, cost in rows
+        ]
+
+    def latest_run(self) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def __repr__(self) -> str:
+        return f"MetricsStore({self.path}, run={self.run_id})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize recorded LLM calls.")
+    parser.add_argument("--run", help="Run id (default: the latest run)")
+    parser.add_argument("--all", action="store_true", help="Summarize every run together")
+    parser.add_argument("--by", choices=list(GROUP_COLUMNS), default="call_site")
+    parser.add_argument("--runs", action="store_true", help="List the recorded runs")
+    args = parser.parse_args()
+
+    store = MetricsStore()
+    if args.runs:
+        print(f"{'run':<14}{'started':<21}{'calls':>7}{'tokens':>10}{'cost $':>10}  label")
+        for run in store.runs():
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started_at"]))
+            print(f"{run['id']:<14}{started:<21}{run['calls']:>7}{run['tokens']:>10}{run['cost']:>10.4f}  {run['label']}")
+        return
+
+    run_id = None if args.all else args.run or store.latest_run()
+    print(f"Run: {run_id or 'all'}\n")
+    print(f"{args.by:<40}{'calls':>7}{'hit %':>7}{'prompt':>10}{'compl.':>9}{'mean s':>8}{'total s':>9}{'cost $':>10}")
+    for row in store.summary(run_id, args.by):
+        print(
+            f"{str(row[args.by]):<40.40}{row['calls']:>7}{100 * row['hit_rate']:>7.0f}{row['prompt_tokens']:>10}"
+            f"{row['completion_tokens']:>9}{row['mean_latency']:>8.2f}{row['latency']:>9.1f}{row['cost']:>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
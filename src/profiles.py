@@ -1,6 +1,14 @@
+import io
 import os
+import re
+import difflib
+import hashlib
+import logging
+import threading
+import unicodedata
 
 import pandas as pd
+from sqlalchemy.exc import SQLAlchemyError
 
 from src.utils import get_id_from_name, get_base_path
 
@@ -86,24 +94,106 @@ class Profile:
                     break
 
 
+# Stored in the candidates table; a reload writes a profile back when any of them changed
+PROFILE_FIELDS = ("name", "interests", "experience", "skills", "education", "profile", "certificates")
+
+# Similarity a name variant needs to resolve to a candidate (difflib ratio)
+FUZZY_NAME_CUTOFF = 0.85
+
+
+def normalize_name(name: str) -> str:
+    """ Lowercase ASCII words only, so 'José  Díaz', "'Jose Diaz'" and '1. Jose Diaz' agree. """
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    name = re.sub(r"^\s*\d+[.)]\s*", "", name)
+    return " ".join(re.sub(r"[^a-z\s-]", " ", name.lower()).split())
+
+
+def profile_fields(profile) -> tuple:
+    # str() so that empty cells (NaN) compare equal to themselves
+    return tuple(str(getattr(profile, field)) for field in PROFILE_FIELDS)
+
+
 class ProfileManager:
+    """ Candidate profiles indexed by id and normalized name. """
 
-    def __init__(self) -> None:
+    def __init__(self, file_path: str = None, candidate_dao=None) -> None:
+        self.file_path = file_path or get_data_path()
+        self.candidate_dao = candidate_dao  # Optional CandidateDAO kept in line on reload
         self.profiles = []
+        self._by_id = {}
+        self._by_name = {}
+        self._mtime = None
+        self._digest = None
+        self._lock = threading.Lock()
         self.load_profiles()
 
     def load_profiles(self) -> list:
-        for data in get_data():
-            self.add_profile(Profile(data))
+        """ Parses the CSV into new indexes and swaps them in only once the parse succeeded.
+        Returns the profiles that are new or changed since the previous load. """
+        mtime = os.path.getmtime(self.file_path)
+        with open(self.file_path, "rb") as file:
+            content = file.read()
+        profiles = [Profile(data) for data in parse_data(content)]
+        by_id, by_name = {}, {}
+        for profile in profiles:
+            by_id[profile.id] = profile
+            by_name.setdefault(normalize_name(profile.name), profile)
+
+        changed = [profile for profile in profiles if profile.id not in self._by_id
+                   or profile_fields(self._by_id[profile.id]) != profile_fields(profile)]
+        self.profiles, self._by_id, self._by_name = profiles, by_id, by_name
+        self._mtime = mtime
+        self._digest = hashlib.sha256(content).hexdigest()
+        return changed
+
+    def reload_if_changed(self) -> bool:
+        """ Reloads the CSV when it was modified since the last load; a new mtime with
+        the same content only updates the stored mtime. A file that fails to parse
+        leaves the loaded profiles in place and is tried again on the next call. """
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.file_path)
+                if mtime == self._mtime:
+                    return False
+                with open(self.file_path, "rb") as file:
+                    digest = hashlib.sha256(file.read()).hexdigest()
+                if digest == self._digest:
+                    self._mtime = mtime
+                    return False
+                logging.info(f"Reloading candidate profiles from {self.file_path}")
+                changed = self.load_profiles()
+            except Exception as e:
+                logging.error(f"Failed to reload candidate profiles from {self.file_path}: {str(e)}")
+                return False
+            self._sync_candidates(changed)
+            return True
+
+    def _sync_candidates(self, profiles: list) -> None:
+        if self.candidate_dao is None or not profiles:
+            return
+        try:
+            for profile in profiles:
+                self.candidate_dao.add_candidate(profile)  # Updates the row of a known candidate
+        except SQLAlchemyError as e:
+            logging.error(f"Failed to store reloaded candidates: {str(e)}")
 
     def add_profile(self, profile: Profile):
         self.profiles.append(profile)
+        self._by_id[profile.id] = profile
+        self._by_name.setdefault(normalize_name(profile.name), profile)
 
     def get_profile(self, name: str) -> Profile:
-        for profile in self.profiles:
-            if profile.name == name:
-                return profile
-        return None
+        """ The candidate of that name, also when the name comes back from the LLM with
+        other casing, accents, quotes or a typo. """
+        key = normalize_name(name)
+        profile = self._by_name.get(key)
+        if profile is None and key:
+            close = difflib.get_close_matches(key, self._by_name.keys(), n=1, cutoff=FUZZY_NAME_CUTOFF)
+            profile = self._by_name[close[0]] if close else None
+        return profile
+
+    def get_profile_by_id(self, profile_id: str) -> Profile:
+        return self._by_id.get(profile_id)
 
     def __repr__(self) -> str:
         return f"ProfileManager(Profiles: {self.profiles})"
@@ -119,11 +209,38 @@ class ProfileManager:
         return description
 
 
-def get_data() -> dict:
-    file_path = os.path.join(get_base_path(), 'candidates', 'candidates.csv')
+_profile_manager = None
+_profile_manager_lock = threading.Lock()
+
+
+def get_profile_manager(candidate_dao=None) -> ProfileManager:
+    """ The process-wide ProfileManager, reloaded when candidates.csv changes. Passing a
+    CandidateDAO keeps the candidates table in line with every reload. """
+    global _profile_manager
+    with _profile_manager_lock:
+        if _profile_manager is None:
+            _profile_manager = ProfileManager(candidate_dao=candidate_dao)
+            return _profile_manager
+        if candidate_dao is not None and _profile_manager.candidate_dao is None:
+            _profile_manager.candidate_dao = candidate_dao
+    _profile_manager.reload_if_changed()
+    return _profile_manager
+
+
+def get_data_path() -> str:
+    return os.path.join(get_base_path(), 'candidates', 'candidates.csv')
+
+
+def get_data(file_path: str = None) -> dict:
+    file_path = file_path or get_data_path()
     if not os.path.exists(file_path):
-        raise "No candidate file"
-    df = pd.read_csv(file_path, delimiter=";")
+        raise FileNotFoundError(f"No candidate file at {file_path}")
+    with open(file_path, "rb") as file:
+        return parse_data(file.read())
+
+
+def parse_data(content: bytes) -> list:
+    df = pd.read_csv(io.BytesIO(content), delimiter=";")
     return df.to_dict(orient="records")
 
 
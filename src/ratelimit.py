@@ -0,0 +1,208 @@
+import time
+import threading
+
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+
+THROTTLE_STATUSES = (429, 503)
+
+DEFAULT_RATE = 4.0  # requests per second per host
+DEFAULT_MAX_CONCURRENCY = 8
+# Weight of a spiking response in the latency baseline (normal responses weigh 0.2)
+SPIKE_WEIGHT = 0.05
+
+
+class TokenBucket:
+    """ Token bucket that hands out reservations: reserve() books the tokens right
+    away and returns how long the caller has to wait before using them. """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @rate.setter
+    def rate(self, value):
+        with self._lock:
+            self._refill()
+            self._rate = value
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def debt_wait(self, limit: float) -> float:
+        """ Seconds until at most `limit` seconds' worth of refill is booked ahead. """
+        with self._lock:
+            self._refill()
+            return max(0.0, -self._tokens / self._rate - limit)
+
+    def acquire(self, tokens: float = 1) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def __repr__(self) -> str:
+        return f"TokenBucket(rate={self.rate}, capacity={self.capacity})"
+
+
+def parse_retry_after(value: str) -> float:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """ Politeness limits for one host: a token bucket for the request rate and an
+    AIMD window for the number of requests in flight. The window grows by
+    `increase` per window's worth of successes and is cut by `decrease` on a
+    429/503 or a latency spike, at most once per `cooldown` seconds. """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+        initial_concurrency: int = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_spike: float = 3.0,
+        cooldown: float = 2.0,
+        backoff: float = 1.0,
+    ) -> None:
+        self._bucket = TokenBucket(rate)
+        self._max_rate = rate
+        self._max_concurrency = max_concurrency
+        self._min_concurrency = min_concurrency
+        self._limit = float(initial_concurrency or min_concurrency)
+        self._increase = increase
+        self._decrease = decrease
+        self._latency_spike = latency_spike
+        self._cooldown = cooldown
+        self._backoff = backoff
+
+        self._in_flight = 0
+        self._latency = None  # Moving average of successful response times
+        self._last_decrease = 0.0
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+        self.requests = 0
+        self.throttled = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def rate(self) -> float:
+        return self._bucket.rate
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self._in_flight >= int(self._limit) or time.monotonic() < self._blocked_until:
+                self._condition.wait(timeout=max(0.01, self._blocked_until - time.monotonic()))
+            self._in_flight += 1
+        try:
+            self._bucket.acquire()
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def record(self, status_code: int, latency: float, retry_after: str = None) -> None:
+        with self._condition:
+            self.requests += 1
+            if status_code in THROTTLE_STATUSES:
+                self.throttled += 1
+                delay = parse_retry_after(retry_after)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + (delay if delay is not None else self._backoff))
+                self._back_off()
+            elif self._latency is not None and latency > self._latency_spike * self._latency:
+                # The baseline follows spikes too, slowly, so that a lasting slowdown
+                # becomes the new normal instead of holding the window at its minimum
+                self._latency = (1 - SPIKE_WEIGHT) * self._latency + SPIKE_WEIGHT * latency
+                self._back_off()
+            else:
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                self._limit = min(self._max_concurrency, self._limit + self._increase / max(self._limit, 1.0))
+                self._bucket.rate = min(self._max_rate, self._bucket.rate * 1.05)
+            self._condition.notify_all()
+
+    def _back_off(self) -> None:
+        now = time.monotonic()
+        # A burst of throttled responses belongs to one congestion event
+        if now - self._last_decrease < self._cooldown:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self._limit = max(self._min_concurrency, self._limit * self._decrease)
+        self._bucket.rate = max(self._max_rate / 10, self._bucket.rate * self._decrease)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "decreases": self.decreases,
+            "limit": self.limit,
+            "rate": self.rate,
+        }
+
+    def __repr__(self) -> str:
+        return f"HostLimiter(limit={self.limit}, rate={self.rate:.2f}, in_flight={self.in_flight})"
+
+
+class RateLimiter:
+    """ Hands out one HostLimiter per host, all built from the same settings. """
+
+    def __init__(self, **settings) -> None:
+        self._settings = settings
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host: str) -> HostLimiter:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostLimiter(**self._settings)
+            return self._hosts[host]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {host: limiter.stats() for host, limiter in self._hosts.items()}
+
+    def __repr__(self) -> str:
+        return f"RateLimiter(hosts={list(self._hosts)})"
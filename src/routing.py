@@ -0,0 +1,73 @@
+import os
+import json
+import logging
+import threading
+
+
+STRONG_MODEL = "gpt-4-turbo"
+CHEAP_MODEL = "gpt-3.5-turbo"
+
+# Models tried per call site, cheapest first; a reply that fails validation moves up one tier
+DEFAULT_ROUTES = {
+    "job_details": [CHEAP_MODEL, STRONG_MODEL],
+    "categorize_description": [CHEAP_MODEL, STRONG_MODEL],
+    "get_parameters_from_raw_description": [CHEAP_MODEL, STRONG_MODEL],
+}
+
+ROUTES_ENV = "LLM_MODEL_ROUTES"
+
+
+class ModelRouter:
+    """ Chooses the model of each call by call site. Sites without a route keep the
+    model they ask for. Counts how often each site had to escalate. """
+
+    def __init__(self, routes: dict = None) -> None:
+        self._routes = {site: list(models) for site, models in (DEFAULT_ROUTES if routes is None else routes).items()}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """ Default routes, overridden per call site by a JSON object in LLM_MODEL_ROUTES,
+        e.g. {"job_details": ["gpt-3.5-turbo", "gpt-4-turbo"], "profile_matcher": ["gpt-4-turbo"]}. """
+        routes = dict(DEFAULT_ROUTES)
+        override = os.getenv(ROUTES_ENV)
+        if override:
+            try:
+                routes.update(json.loads(override))
+            except json.JSONDecodeError as e:
+                logging.error(f"Ignoring invalid {ROUTES_ENV}: {str(e)}")
+        return cls(routes)
+
+    @property
+    def routes(self):
+        return self._routes
+
+    def tiers(self, call_site: str) -> int:
+        return len(self._routes.get(call_site, ())) or 1
+
+    def model(self, call_site: str, requested: str, tier: int = 0) -> str:
+        models = self._routes.get(call_site)
+        if not models:
+            return requested
+        return models[min(tier, len(models) - 1)]
+
+    def record(self, call_site: str, tier: int, valid: bool = True) -> None:
+        """ Counts a validated call that was answered at `tier` (0 = first model). """
+        with self._lock:
+            counts = self._counts.setdefault(call_site, {"calls": 0, "escalated": 0, "invalid": 0})
+            counts["calls"] += 1
+            if tier > 0:
+                counts["escalated"] += 1
+            if not valid:
+                counts["invalid"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                call_site: {**counts, "escalation_rate": counts["escalated"] / counts["calls"]}
+                for call_site, counts in self._counts.items()
+            }
+
+    def __repr__(self) -> str:
+        return f"ModelRouter(routes={self.routes})"
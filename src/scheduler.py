@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager, asynccontextmanager
+
+
+# Priority classes, served in this order
+INTERACTIVE = 0
+MATCHING = 1
+BULK = 2
+PRIORITIES = (INTERACTIVE, MATCHING, BULK)
+
+DEFAULT_SLOTS = 6
+DEFAULT_RESERVED_INTERACTIVE = 1
+
+
+class Ticket:
+    def __init__(self, priority: int, owner) -> None:
+        self.priority = priority
+        self.owner = owner
+
+    def __repr__(self) -> str:
+        return f"Ticket(priority={self.priority}, owner={self.owner})"
+
+
+class LLMScheduler:
+    """ Hands out a fixed number of request slots shared by every LLM call.
+    Waiting calls are granted by priority class, and round-robin between owners
+    (e.g. one crawl or one matching run) inside a class. Some slots are held back
+    for interactive calls so background work can never fill all of them.
+    Cancelling an owner also refuses its later requests, until reset(owner). """
+
+    def __init__(self, slots: int = DEFAULT_SLOTS, reserved_interactive: int = DEFAULT_RESERVED_INTERACTIVE) -> None:
+        self._slots = slots
+        self._reserved = min(reserved_interactive, slots - 1)
+        self._running = {priority: 0 for priority in PRIORITIES}
+        # priority -> owner -> queued grant futures; owners rotate to share the class fairly
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._cancelled = set()  # (owner, priority) pairs; priority None covers every class
+        self._lock = threading.Lock()
+
+    @property
+    def slots(self):
+        return self._slots
+
+    def request(self, priority: int = BULK, owner=None) -> Future:
+        """ Queues a request for a slot; the returned future resolves to a Ticket once granted. """
+        future = Future()
+        with self._lock:
+            if (owner, None) in self._cancelled or (owner, priority) in self._cancelled:
+                future.cancel()
+                return future
+            self._queues[priority].setdefault(owner, deque()).append((future, Ticket(priority, owner)))
+            self._dispatch()
+        return future
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            self._running[ticket.priority] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: int = BULK, owner=None):
+        ticket = self.request(priority, owner).result()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = BULK, owner=None):
+        future = self.request(priority, owner)
+        try:
+            ticket = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The slot may have been granted just as the waiting task was cancelled
+            with self._lock:
+                granted = future.done() and not future.cancelled()
+            if granted:
+                self.release(future.result())
+            raise
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def cancel(self, owner=None, priority: int = None) -> int:
+        """ Cancels queued (not yet running) requests of an owner, optionally of one class only.
+        Requests the owner makes afterwards are cancelled straight away, so calls that had
+        not asked for a slot yet (e.g. the rest of a complete_many chunk) never run.
+        Returns the number of queued requests cancelled. """
+        cancelled = 0
+        with self._lock:
+            if owner is not None:
+                self._cancelled.add((owner, priority))
+            for queue_priority, owners in self._queues.items():
+                if priority is not None and queue_priority != priority:
+                    continue
+                waiting = owners.pop(owner, None)
+                for future, _ in waiting or ():
+                    if future.cancel():
+                        cancelled += 1
+        return cancelled
+
+    def reset(self, owner) -> None:
+        """ Lets a cancelled owner request slots again. """
+        with self._lock:
+            self._cancelled = {entry for entry in self._cancelled if entry[0] != owner}
+
+    def queued(self, priority: int = None) -> int:
+        with self._lock:
+            return sum(
+                len(waiting)
+                for queue_priority, owners in self._queues.items()
+                if priority is None or queue_priority == priority
+                for waiting in owners.values()
+            )
+
+    def _dispatch(self) -> None:
+        for priority in PRIORITIES:
+            while self._has_capacity(priority):
+                entry = self._next(priority)
+                if entry is None:
+                    break
+                future, ticket = entry
+                self._running[priority] += 1
+                future.set_result(ticket)
+
+    def _has_capacity(self, priority: int) -> bool:
+        running = sum(self._running.values())
+        if priority == INTERACTIVE:
+            return running < self._slots
+        return running < self._slots - self._reserved
+
+    def _next(self, priority: int):
+        owners = self._queues[priority]
+        while owners:
+            owner, waiting = next(iter(owners.items()))
+            future, ticket = waiting.popleft()
+            # Rotate the owner to the back so the next grant goes to someone else
+            del owners[owner]
+            if waiting:
+                owners[owner] = waiting
+            if future.set_running_or_notify_cancel():
+                return future, ticket
+        return None
+
+    def __repr__(self) -> str:
+        return f"LLMScheduler(slots={self.slots}, running={self._running})"
@@ -1,13 +1,24 @@
-import requests
+import asyncio
+import os
+import queue
+import logging
+import threading
 
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 
+from bs4 import BeautifulSoup, SoupStrainer
+
+from src.fetcher import fetch_html
+from src.compact import compact_description
+from src.infoblock import extract_parameters
 from src.utils import (
     Agent,
     clean_text,
-    categorize_description,
-    get_parameters_from_raw_description,
+    extract_job_details,
+    job_details_request,
+    missing_parameters,
     get_id_from_name,
+    get_content_fingerprint,
 )
 from src.db.db import JobDAO
 
@@ -110,11 +121,84 @@ class Assignment:
         """
 
 
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = "lxml"
+except ImportError:
+    FAST_PARSER = "html.parser"
+
+DEFAULT_WORKERS = 4
+OPEN_STATUS = "Open"
+# Overridable so a crawl can run against a local stand-in server
+LISTING_URL = os.getenv("STRIIVE_LISTING_URL", "https://striive.com/nl/opdrachten/")
+STATUS_BUTTON_CLASS = "hfp_button hfp-button-outline-success no-transition mb-4 d-none d-sm-block"
+
+# The only parts of a posting page the extractors read
+JOB_PAGE_SECTIONS = {
+    "url_segments": {"class": "hfp_url-segments"},
+    "status_button": {"class": STATUS_BUTTON_CLASS},
+    "recruiter": {"id": "hfp_recruiter-info-block"},
+    "assignments": {"id": "hfp_assignments"},
+    "info_block": {"id": "hfp_assignment-info-block"},
+}
+
+
+def _attr_matches(attrs: dict, key: str, value: str) -> bool:
+    actual = attrs.get(key)
+    if not actual:
+        return False
+    if key == "class":
+        # Same rule as class_= in find: the full class string or any single class
+        classes = actual if isinstance(actual, str) else " ".join(actual)
+        return classes == value or value in classes.split()
+    return actual == value
+
+
+def _section_filter(specs: list[dict]):
+    def is_job_section(name: str, attrs: dict) -> bool:
+        if name != "div":
+            return False
+        return any(
+            _attr_matches(attrs, key, value)
+            for spec in specs
+            for key, value in spec.items()
+        )
+    return is_job_section
+
+
+def parse_job_page(html: str, fast: bool = True, sections=None) -> tuple[BeautifulSoup, dict]:
+    """ Parses a posting page and looks up each extractor section once.
+    In fast mode only the section subtrees are built, on the lxml backend when installed;
+    `sections` narrows that to a subset of JOB_PAGE_SECTIONS. """
+    wanted = {key: JOB_PAGE_SECTIONS[key] for key in (sections or JOB_PAGE_SECTIONS)}
+    if fast:
+        strainer = SoupStrainer(_section_filter(list(wanted.values())))
+        soup = BeautifulSoup(html, FAST_PARSER, parse_only=strainer)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+
+    sections = {key: soup.find("div", attrs=spec) for key, spec in wanted.items()}
+    return soup, sections
+
+
+def _status_from_sections(sections: dict) -> str:
+    button_div = sections.get("status_button")
+
+    try:
+        a_tag = button_div.find("a")
+    except AttributeError:
+        a_tag = None
+
+    return a_tag.text.strip() if a_tag else None
+
+
 class Job:
-    def __init__(self, agent: Agent, url: str, position: str=None, company: str=None) -> None:
+    def __init__(self, agent: Agent, url: str, position: str=None, company: str=None, session=None, fast_parse: bool = True, lazy: bool = False) -> None:
         self._agent = agent
         self._url = url
-        self._soup = self._get_soup()
+        self._session = session
+        self._fast_parse = fast_parse
+        self._soup, self._sections = self._get_soup()
 
         self.position = position
         self.company = company
@@ -129,9 +213,15 @@ class Job:
         self._status = self._get_job_status()
         self._submitter = self._get_job_submitter()
         self._candidates = []
-        self._get_job_params()
-        self._assignment = self._get_assignment_from_url()
+        self._assignment = None
         self._id = get_id_from_name(f"{self.position}{self.company}")
+        self._fingerprint = get_content_fingerprint(self._get_raw_job_params() + self._get_raw_job_description())
+
+        # Lazy jobs defer the LLM calls until an enriched field is read or enrich() runs
+        self._enriched = False
+        self._enrich_lock = threading.Lock()
+        if not lazy:
+            self.enrich()
 
     @property
     def soup(self):
@@ -147,26 +237,32 @@ class Job:
 
     @property
     def commitment(self):
+        self.enrich()
         return self._commitment
 
     @property
     def start(self):
+        self.enrich()
         return self._start
 
     @property
     def location(self):
+        self.enrich()
         return self._location
 
     @property
     def max_hourly_rate(self):
+        self.enrich()
         return self._max_hourly_rate
 
     @property
     def end(self):
+        self.enrich()
         return self._end
 
     @property
     def deadline(self):
+        self.enrich()
         return self._deadline
 
     @property
@@ -183,12 +279,21 @@ class Job:
 
     @property
     def assignment(self):
+        self.enrich()
         return self._assignment
     
     @property
     def id(self):
         return self._id
 
+    @property
+    def enriched(self):
+        return self._enriched
+
+    @property
+    def fingerprint(self):
+        return self._fingerprint
+
     @url.setter
     def url(self, value):
         self._url = value
@@ -233,6 +338,54 @@ class Job:
     def status(self, value):
         self._status = value
 
+    def enrich(self, content: str = None) -> "Job":
+        """ Runs the LLM stage once; `content` is a reply to enrichment_request() obtained elsewhere. """
+        if self._enriched:
+            return self
+        with self._enrich_lock:
+            if not self._enriched:
+                details = extract_job_details(
+                    self.agent, self._get_raw_job_params(), self._get_prompt_description(), content, self.id,
+                    self._get_known_params(),
+                )
+                self._set_job_params(details["parameters"])
+                self._assignment = Assignment(details["description"])
+                self._enriched = True
+        return self
+
+    def release_page(self) -> None:
+        """ Drops the parsed page, keeping only the texts enrichment still needs, so a
+        listed job waiting for its LLM calls holds a few strings rather than a soup. """
+        if not self._enriched:
+            self._get_raw_job_params()
+            self._get_prompt_description()
+            self._get_known_params()
+        self._soup = None
+        self._sections = None
+
+    def enrichment_request(self) -> dict:
+        return job_details_request(
+            self._get_raw_job_params(), self._get_prompt_description(), self.id,
+            missing_parameters(self._get_known_params()),
+        )
+
+    def apply_enrichment(self, job_model) -> None:
+        """ Copies the LLM-derived fields of a stored job with the same content. """
+        with self._enrich_lock:
+            self._commitment = job_model.commitment
+            self._start = job_model.start
+            self._location = job_model.location
+            self._max_hourly_rate = job_model.max_hourly_rate
+            self._end = job_model.end
+            self._deadline = job_model.deadline
+            if job_model.assignment:
+                self._assignment = Assignment({
+                    "SKILLS": job_model.assignment.skills,
+                    "REQUIREMENTS": job_model.assignment.requirements,
+                    "PREFERENCES": job_model.assignment.preferences,
+                })
+            self._enriched = True
+
     def update_motivation(self, candidate, new_motivation):
             # Update motivation in the Job's candidates list
             for index, (c, m) in enumerate(self.candidates):
@@ -257,10 +410,9 @@ class Job:
                 {self.assignment}
                 """
 
-    def _get_soup(self) -> BeautifulSoup:
-        html_file = requests.get(self.url).text
-        soup = BeautifulSoup(html_file, "html.parser")
-        return soup
+    def _get_soup(self) -> tuple[BeautifulSoup, dict]:
+        html_file = fetch_html(self.url, self._session)
+        return parse_job_page(html_file, fast=self._fast_parse)
     
     def _check_complete(self) -> None:
         if not self.position or not self.company:
@@ -270,7 +422,7 @@ class Job:
             
     def _force_complete(self) -> dict[str, str]:
         details = {}
-        container = self.soup.find('div', class_='hfp_url-segments')
+        container = self._sections["url_segments"]
         spans = container.find_all('span')
 
         details['company'] = spans[0].get_text(strip=True) if spans else None
@@ -280,23 +432,12 @@ class Job:
 
     def _get_job_status(self) -> str:
         # print(f"\nGetting job status for:\n{self.position} at {self.company}\n")
-
-        button_div = self.soup.find(
-            "div",
-            class_="hfp_button hfp-button-outline-success no-transition mb-4 d-none d-sm-block",
-        )
-
-        try:
-            a_tag = button_div.find("a")
-        except AttributeError:
-            a_tag = None
-
-        return a_tag.text.strip() if a_tag else None
+        return _status_from_sections(self._sections)
     
     def _get_job_submitter(self) -> Contact:
         # print(f"\nGetting job submitter for:\n{self.position} at {self.company}\n")
 
-        submitter_block = self.soup.find("div", {"id": "hfp_recruiter-info-block"})
+        submitter_block = self._sections["recruiter"]
 
         name_tag = submitter_block.find("b")
         name = name_tag.get_text(strip=True) if name_tag else None
@@ -320,14 +461,30 @@ class Job:
     def _get_raw_job_description(self) -> str:
         # print(f"\nGetting job description for:\n{self.position} at {self.company}\n")
 
-        assignments = self.soup.find("div", {"id": "hfp_assignments"})
+        assignments = self._sections["assignments"]
         description = assignments.find("div", class_="hfp_content").text.strip()
         # print(f"\n --debug--\n\nDescription: {description}\n--debug--\n")
         cleaned_text = clean_text(description)
         return cleaned_text
 
-    def _get_raw_job_params(self) -> str:
-        info_block = self.soup.find("div", {"id": "hfp_assignment-info-block"})
+    def _get_prompt_description(self) -> str:
+        # The fingerprint keeps using the full text; only the prompt is compacted.
+        # Compaction runs before clean_text, which would flatten the lines and bullets.
+        if getattr(self, "_prompt_description", None) is None:
+            content = self._sections["assignments"].find("div", class_="hfp_content")
+            self._prompt_description = clean_text(compact_description(content.get_text("\n")))
+        return self._prompt_description
+
+    def _get_known_params(self) -> dict:
+        # Parameters read from the info block's labels; the LLM is only asked for the rest
+        if getattr(self, "_known_params", None) is None:
+            self._known_params = extract_parameters(self._get_job_info())
+        return self._known_params
+
+    def _get_job_info(self) -> dict:
+        if getattr(self, "_job_info", None) is not None:
+            return self._job_info
+        info_block = self._sections["info_block"]
 
         hfp_items = info_block.find_all("div", class_="hfp_item")
 
@@ -335,33 +492,24 @@ class Job:
 
         for item in hfp_items:
             # The key is the text of the 'p' tag
-            key = item.find("p").text.strip().lower() if item.find("p") else None
+            key_tag = item.find("p")
+            key = key_tag.text.strip().lower() if key_tag else None
             # The value is the text of the 'b' tag
-            value = item.find("b").text.strip() if item.find("b") else None
+            value_tag = item.find("b")
+            value = value_tag.text.strip() if value_tag else None
 
             if key:
                 params_info[key] = value
 
-        # print("\n".join(
-        #     f"{key.capitalize()}: {value}" for key, value in params_info.items()
-        # ))
+        self._job_info = params_info
+        return params_info
 
+    def _get_raw_job_params(self) -> str:
         return "\n".join(
-            f"{key.capitalize()}: {value}" for key, value in params_info.items()
+            f"{key.capitalize()}: {value}" for key, value in self._get_job_info().items()
         )
 
-    def _get_assignment_from_url(self) -> Assignment:
-        # print(f"\nGetting assignment for:\n{self.position} at {self.company}\n")
-        # print(f"\nCleaned text:\n {cleaned_text}\n")
-        cleaned_text = self._get_raw_job_description()
-        assignment = Assignment(categorize_description(self.agent, cleaned_text))
-        return assignment
-
-    def _get_job_params(self) -> dict:
-        # print(f"\nGetting job parameters for:\n{self.position} at {self.company}\n")
-        cleaned_text = self._get_raw_job_params() + self._get_raw_job_description()
-        params = get_parameters_from_raw_description(self.agent, cleaned_text)
-
+    def _set_job_params(self, params: dict) -> None:
         key_to_attribute = {
             "commitment": "commitment",
             "location": "location",
@@ -373,33 +521,314 @@ class Job:
 
         for key, value in params.items():
             attr = key_to_attribute.get(key)
-            if attr and hasattr(self, attr):
-                setattr(self, attr, value)
+            if attr:
+                # Write the backing field; the property getters would re-enter enrich()
+                setattr(self, f"_{attr}", value)
+
+
+def _parse_job_card(card) -> tuple[str, str, str]:
+    link = card.find("a", href=True)["href"] if card.find("a", href=True) else None
+    title = card.find("div", class_="hfp_card-title hfp_ellipsize").text.strip() if card.find("div", class_="hfp_card-title hfp_ellipsize") else "No Title"
+    company = card.find("div", class_="hfp_card-company hfp_ellipsize").text.strip() if card.find("div", class_="hfp_card-company hfp_ellipsize") else "No Company"
+    return link, title, company
+
+
+# What a crawl does with a fetched posting, decided from its content fingerprint
+NEW = "new"
+REUSED = "reused"
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+
+LLM_CALLS_PER_JOB = 1
+# Unchanged postings of a refreshing crawl are written a results page (12 cards) at a time
+REFRESH_BATCH_SIZE = 12
+
+
+class CrawlStats:
+    def __init__(self) -> None:
+        self.new = 0
+        self.reused = 0
+        self.unchanged = 0
+        self.changed = 0
+        self.llm_calls_saved = 0
 
+    def __repr__(self) -> str:
+        return (
+            f"CrawlStats(new={self.new}, reused={self.reused}, unchanged={self.unchanged}, "
+            f"changed={self.changed}, llm_calls_saved={self.llm_calls_saved})"
+        )
+
+
+class FingerprintIndex:
+    """ In-memory snapshot of stored job ids and content fingerprints for one crawl. """
+
+    def __init__(self, rows) -> None:
+        self._by_id = {}
+        self._by_fingerprint = {}
+        for job_id, fingerprint in rows:
+            self.add(job_id, fingerprint)
+
+    def add(self, job_id: str, fingerprint: str) -> None:
+        self._by_id[job_id] = fingerprint
+        if fingerprint:
+            self._by_fingerprint.setdefault(fingerprint, job_id)
+
+    def classify(self, job: Job) -> tuple[str, str]:
+        if job.id in self._by_id:
+            stored = self._by_id[job.id]
+            # Rows stored before fingerprints existed are kept and just get one recorded
+            if stored is None or stored == job.fingerprint:
+                return UNCHANGED, job.id
+            return CHANGED, job.id
+        source_id = self._by_fingerprint.get(job.fingerprint)
+        if source_id:
+            return REUSED, source_id
+        return NEW, None
+
+
+def _build_jobs_concurrently(build, cards, workers: int):
+    # Keep at most two jobs per worker in flight so a long card stream never
+    # turns into an unbounded backlog of pending futures.
+    max_in_flight = workers * 2
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-fetch")
+    pending = set()
+    try:
+        for card in cards:
+            pending.add(executor.submit(build, *card))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # Reached on cancel as well: drop queued jobs instead of fetching them.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _listing_url(query: str = None, page: int = 1) -> str:
+    params = []
+    if query:
+        params.append(f"query={query.replace(' ', '%20')}")
+    if page > 1:
+        params.append(f"page={page}")
+    return f"{LISTING_URL}?{'&'.join(params)}" if params else LISTING_URL
+
+
+def iter_job_pages(query: str = None, max_pages: int = 1):
+    """ Yields the list of (link, title, company) cards on each results page, one page at a time.
+    max_pages=None walks every page until the listing runs out. """
+    page = 1
+    previous_links = None
+    while max_pages is None or page <= max_pages:
+        html_file = fetch_html(_listing_url(query, page))
+        soup = BeautifulSoup(html_file, "html.parser")
+        cards = [_parse_job_card(card) for card in soup.find_all("div", class_="col-md-4")]
+        soup.decompose()
+
+        links = [link for link, _, _ in cards]
+        # Past the last page the site either returns no cards or repeats the last page
+        if not cards or links == previous_links:
+            break
 
-def get_jobs(agent: Agent, job_dao, query: str = None):
-    url = (
-        f"https://striive.com/nl/opdrachten/?query={query.replace(' ', '%20')}"
-        if query
-        else "https://striive.com/nl/opdrachten/"
-    )
+        yield cards
+        previous_links = links
+        page += 1
 
-    html_file = requests.get(url).text
-    soup = BeautifulSoup(html_file, "html.parser")
-    job_cards = soup.find_all("div", class_="col-md-4")
 
-    for card in job_cards:
-        link = card.find("a", href=True)["href"] if card.find("a", href=True) else None
-        title = card.find("div", class_="hfp_card-title hfp_ellipsize").text.strip() if card.find("div", class_="hfp_card-title hfp_ellipsize") else "No Title"
-        company = card.find("div", class_="hfp_card-company hfp_ellipsize").text.strip() if card.find("div", class_="hfp_card-company hfp_ellipsize") else "No Company"
+def iter_job_cards(query: str = None, max_pages: int = 1):
+    for cards in iter_job_pages(query, max_pages):
+        yield from cards
 
-        job_id = get_id_from_name(f"{title}{company}")
 
-        # Check if the job already exists in the database
-        existing_job = job_dao.get_job_by_id(job_id)
-        if not existing_job:
-            job = Job(agent, link, title, company)
+def iter_query_pages(queries: list[str], max_pages: int = 1, workers: int = DEFAULT_WORKERS):
+    """ Fans out over several searches at once, yielding each results page as it arrives. """
+    if len(queries) == 1:
+        yield from iter_job_pages(queries[0], max_pages)
+        return
+
+    # Bounded so fast searches wait for the consumer instead of piling up pages
+    pages = queue.Queue(maxsize=max(workers, 1) * 2)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def crawl(query):
+        try:
+            for cards in iter_job_pages(query, max_pages):
+                if not put(cards):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(finished)
+
+    executor = ThreadPoolExecutor(max_workers=min(max(workers, 1), len(queries)), thread_name_prefix="listing-fetch")
+    try:
+        for query in queries:
+            executor.submit(crawl, query)
+
+        remaining = len(queries)
+        while remaining:
+            item = pages.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_jobs(agent: Agent, job_dao, query: str | list[str] = None, workers: int = 1, max_pages: int = 1,
+             lazy: bool = False, refresh: bool = False, stats: "CrawlStats" = None):
+    """ Yields new jobs from the listing. `query` may be a list of searches, which are
+    crawled concurrently and merged so each posting is built only once.
+    With refresh=True postings already in the database are fetched too: their status
+    is updated in place, and they are only re-enriched when their content fingerprint changed.
+    With refresh=False they are skipped without a fetch, by one id lookup per results page. """
+    stats = stats if stats is not None else CrawlStats()
+    fingerprints = FingerprintIndex(job_dao.list_fingerprints())
+    queries = list(query) if isinstance(query, (list, tuple)) else [query]
+    pages = iter_query_pages(queries or [None], max_pages, workers)
+    cards = _new_cards(pages, job_dao, include_known=refresh)
+
+    owner = agent.current_owner()  # Re-enrichment on the fetch threads counts for the caller's run
+
+    def build(link, title, company):
+        with agent.owned_by(owner):
+            job = Job(agent, link, title, company, lazy=True)
+            decision, source_id = fingerprints.classify(job)
+            if decision == CHANGED or (decision == NEW and not lazy):
+                job.enrich()
+        return job, decision, source_id
+
+    if workers > 1:
+        results = _build_jobs_concurrently(build, cards, workers)
+    else:
+        results = (build(*card) for card in cards)
+
+    refreshed = {}  # Unchanged postings, written REFRESH_BATCH_SIZE at a time
+    try:
+        yield from _classified_jobs(results, job_dao, fingerprints, stats, refreshed)
+    finally:
+        job_dao.refresh_jobs(refreshed)
+
+
+def _classified_jobs(results, job_dao, fingerprints, stats, refreshed):
+    for job, decision, source_id in results:
+        if decision == NEW:
+            stats.new += 1
+            fingerprints.add(job.id, job.fingerprint)
+            job.release_page()
+            yield job
+        elif decision == REUSED:
+            # Same posting text under a new title: copy the stored enrichment
+            job.apply_enrichment(job_dao.get_job_by_id(source_id))
+            stats.reused += 1
+            stats.llm_calls_saved += LLM_CALLS_PER_JOB
+            fingerprints.add(job.id, job.fingerprint)
+            job.release_page()
+            yield job
+        elif decision == CHANGED:
+            job_dao.update_enrichment(job)
+            stats.changed += 1
+            fingerprints.add(job.id, job.fingerprint)
+        else:
+            refreshed[job.id] = (job.status, job.fingerprint)
+            if len(refreshed) >= REFRESH_BATCH_SIZE:
+                job_dao.refresh_jobs(refreshed)
+                refreshed.clear()
+            stats.unchanged += 1
+            stats.llm_calls_saved += LLM_CALLS_PER_JOB
+
+
+def enrich_jobs(jobs: list[Job], chunk_size: int = None, owner=None):
+    """ Runs the LLM stage for a batch of lazy jobs through Agent.complete_many, yielding
+    each chunk's jobs once they are enriched. Jobs sharing an Agent share its limits.
+    The calls run at bulk priority under owner, so Agent.cancel_pending(owner) ends the run. """
+    pending = [job for job in jobs if not job.enriched]
+    for job in jobs:
+        if job.enriched:
             yield job
+    if not pending:
+        return
+
+    agent = pending[0].agent
+    chunk_size = chunk_size or agent.max_in_flight * 2
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        replies = agent.complete_many([job.enrichment_request() for job in chunk], owner=owner)
+        for job, reply in zip(chunk, replies):
+            if isinstance(reply, asyncio.CancelledError):
+                return
+            if isinstance(reply, Exception):
+                logging.error(f"Enrichment request failed for {job.position}, retrying alone: {str(reply)}")
+                reply = None
+            yield job.enrich(reply)
+
+
+def fetch_job_status(url: str) -> str:
+    """ The status shown on the posting; raises when the page could not be fetched or
+    has no status button, so that a throttled or broken page never closes a job. """
+    _, sections = parse_job_page(fetch_html(url, strict=True), sections=("status_button",))
+    status = _status_from_sections(sections)
+    if status is None:
+        raise ValueError(f"No status button on {url}")
+    return status
+
+
+def refresh_statuses(job_dao, workers: int = DEFAULT_WORKERS) -> dict:
+    """ Re-reads the status button of every stored open job without rebuilding the Job.
+    Returns {job_id: (old_status, new_status)} for the jobs whose status changed. """
+    jobs = [(job.id, job.url) for job in job_dao.list_jobs_by_status(OPEN_STATUS) if job.url]
+
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="status-refresh") as executor:
+        futures = {executor.submit(fetch_job_status, url): job_id for job_id, url in jobs}
+        for future in as_completed(futures):
+            job_id = futures[future]
+            try:
+                statuses[job_id] = future.result()
+            except Exception as e:
+                logging.error(f"Failed to refresh status of job {job_id}: {str(e)}")
+
+    return job_dao.update_statuses(statuses)
+
+
+def _new_cards(pages, job_dao, include_known: bool = False):
+    # Overlapping searches return the same cards; keep only the first by id or link
+    seen_ids = set()
+    seen_links = set()
+    for cards in pages:
+        page = []
+        for link, title, company in cards:
+            job_id = get_id_from_name(f"{title}{company}")
+            if job_id not in seen_ids and link not in seen_links:
+                seen_ids.add(job_id)
+                if link:
+                    seen_links.add(link)
+                page.append((job_id, (link, title, company)))
+
+        # One lookup per results page against the ids already in the database; with
+        # include_known (a refreshing crawl) every card is fetched to re-check its status
+        known = set() if include_known else job_dao.filter_known([job_id for job_id, _ in page])
+        for job_id, card in page:
+            if job_id not in known:
+                yield card
 
 def collect_all_jobs(agent: Agent, query=None) -> list[Job]:
     all_jobs = []
@@ -1,19 +1,338 @@
 import os
 import sys
+import json
+import time
+import asyncio
 import hashlib
+import logging
+import functools
+import threading
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, RateLimitError
 
+from contextlib import nullcontext, contextmanager, asynccontextmanager
 
-class Agent:
-    def __init__(self) -> None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key)
+from src.ratelimit import TokenBucket, parse_retry_after
+from src.scheduler import BULK, INTERACTIVE
+
+
+# Client-side copy of the account limits for gpt-4-turbo
+DEFAULT_RPM = 500
+DEFAULT_TPM = 30_000
+MAX_IN_FLIGHT = 8
+MAX_RATE_LIMIT_RETRIES = 5
+COMPLETION_TOKEN_ESTIMATE = 500
+# Share of the limits held back for interactive calls, so queued bulk work never delays them
+INTERACTIVE_SHARE = 0.1
+# Seconds of refill that bulk and matching calls may book ahead of their buckets
+MAX_BULK_DEBT = 5.0
 
+# Cache status of a call, as recorded in the metrics store
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_BYPASS = "bypass"
+CACHE_OFF = "off"
 
-def categorize_description(agent: Agent, text: str) -> dict:
 
-    response = agent.client.chat.completions.create(
+class Agent:
+    def __init__(self, cache=None, scheduler=None, metrics=None, router=None, max_in_flight: int = MAX_IN_FLIGHT,
+                 rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM, api_key: str = None, base_url: str = None) -> None:
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        # base_url defaults to OPENAI_BASE_URL, e.g. a local stand-in from src.fakes.openai_server
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.cache = cache  # Optional LLMCache shared by every prompt
+        self.scheduler = scheduler  # Optional LLMScheduler deciding which waiting call goes next
+        self.metrics = metrics  # Optional MetricsStore recording every call
+        self.router = router  # Optional ModelRouter picking the model per call site
+        self.max_in_flight = max_in_flight
+        self._runs = {}  # owner -> metrics run id, so overlapping runs keep their own calls
+        self._local = threading.local()  # The owner calls on this thread are made for
+        # Shared by sync and async calls; bursts of up to ten seconds' worth are allowed
+        share = 1 - INTERACTIVE_SHARE
+        self.requests_bucket = TokenBucket(share * rpm / 60, capacity=share * rpm / 6)
+        self.tokens_bucket = TokenBucket(share * tpm / 60, capacity=share * tpm / 6)
+        # Interactive calls draw on their own share; a minute's worth covers a burst of letters
+        self.interactive_requests_bucket = TokenBucket(INTERACTIVE_SHARE * rpm / 60, capacity=INTERACTIVE_SHARE * rpm)
+        self.interactive_tokens_bucket = TokenBucket(INTERACTIVE_SHARE * tpm / 60, capacity=INTERACTIVE_SHARE * tpm)
+
+    def complete(self, messages: list, model: str = "gpt-4-turbo", temperature: float = 0.1,
+                 use_cache: bool = True, priority: int = BULK, owner=None,
+                 call_site: str = None, job_id: str = None, tier: int = 0, **kwargs) -> str:
+        """ Returns the content of a chat completion, served from the cache when an
+        identical request was answered before. use_cache=False always calls the API
+        and replaces the stored answer. With a scheduler, the call waits for a slot
+        of its priority class; owner groups calls for fair sharing and cancellation.
+        call_site and job_id tag the call in the metrics store. With a router, the
+        call site and tier choose the model. """
+        model = self.route(call_site, model, tier)
+        key, cached, cache_status = self._cache_lookup(messages, model, temperature, use_cache, kwargs)
+        if cached is not None:
+            self._record(call_site, job_id, model, cache_status, messages, cached, owner=owner)
+            return cached
+
+        estimate = estimate_tokens(messages) + kwargs.get("max_tokens", COMPLETION_TOKEN_ESTIMATE)
+        with self._slot(priority, owner):
+            self._throttle(priority, estimate)
+            start = time.perf_counter()
+            response = self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, **kwargs
+            )
+            latency = time.perf_counter() - start
+        self._settle_tokens(response, estimate, priority)
+        content = response.choices[0].message.content
+
+        self._record(call_site, job_id, model, cache_status, messages, content, response, latency, owner)
+        self._cache_store(key, model, content)
+        return content
+
+    def stream(self, messages: list, model: str = "gpt-4-turbo", temperature: float = 0.1,
+               use_cache: bool = True, priority: int = BULK, owner=None,
+               call_site: str = None, job_id: str = None, tier: int = 0, **kwargs):
+        """ Like complete(), but yields the reply in pieces as they arrive. A cached
+        reply comes as a single piece; the full reply is cached once the stream ends. """
+        model = self.route(call_site, model, tier)
+        key, cached, cache_status = self._cache_lookup(messages, model, temperature, use_cache, kwargs)
+        if cached is not None:
+            self._record(call_site, job_id, model, cache_status, messages, cached, owner=owner)
+            yield cached
+            return
+
+        estimate = estimate_tokens(messages) + kwargs.get("max_tokens", COMPLETION_TOKEN_ESTIMATE)
+        pieces = []
+        with self._slot(priority, owner):
+            self._throttle(priority, estimate)
+            start = time.perf_counter()
+            response = self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, stream=True, **kwargs
+            )
+            with response:
+                for chunk in response:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        pieces.append(delta)
+                        yield delta
+            latency = time.perf_counter() - start
+
+        content = "".join(pieces)
+        # Streams report no usage, so the token bucket keeps the estimate
+        self._record(call_site, job_id, model, cache_status, messages, content, latency=latency, owner=owner)
+        self._cache_store(key, model, content)
+
+    def complete_many(self, requests: list[dict], priority: int = BULK, owner=None) -> list:
+        """ Runs many complete() requests (given as keyword dicts) concurrently, at most
+        max_in_flight at a time. Results come back in request order; a request that
+        failed or was cancelled holds its exception instead of a string. """
+        async def run():
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            # A fresh client per run, since its connections belong to this event loop
+            async with AsyncOpenAI(api_key=self.client.api_key, base_url=self.client.base_url, max_retries=0) as client:
+                return await asyncio.gather(
+                    *(
+                        self._acomplete(client, semaphore, **{"priority": priority, "owner": owner, **request})
+                        for request in requests
+                    ),
+                    return_exceptions=True,
+                )
+
+        return asyncio.run(run())
+
+    async def _acomplete(self, client: AsyncOpenAI, semaphore: asyncio.Semaphore, messages: list,
+                         model: str = "gpt-4-turbo", temperature: float = 0.1, use_cache: bool = True,
+                         priority: int = BULK, owner=None, call_site: str = None, job_id: str = None,
+                         tier: int = 0, **kwargs) -> str:
+        model = self.route(call_site, model, tier)
+        key, cached, cache_status = self._cache_lookup(messages, model, temperature, use_cache, kwargs)
+        if cached is not None:
+            self._record(call_site, job_id, model, cache_status, messages, cached, owner=owner)
+            return cached
+
+        estimate = estimate_tokens(messages) + kwargs.get("max_tokens", COMPLETION_TOKEN_ESTIMATE)
+        async with semaphore, self._aslot(priority, owner):
+            start = time.perf_counter()
+            for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+                await asyncio.sleep(self._debt_delay(priority))
+                await asyncio.sleep(self._reserve(priority, estimate))
+                try:
+                    response = await client.chat.completions.create(
+                        model=model, messages=messages, temperature=temperature, **kwargs
+                    )
+                    break
+                except RateLimitError as e:
+                    if attempt == MAX_RATE_LIMIT_RETRIES:
+                        raise
+                    delay = _retry_after(e, attempt)
+                    logging.warning(f"Rate limited by OpenAI, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            latency = time.perf_counter() - start
+
+        self._settle_tokens(response, estimate, priority)
+        content = response.choices[0].message.content
+        self._record(call_site, job_id, model, cache_status, messages, content, response, latency, owner)
+        self._cache_store(key, model, content)
+        return content
+
+    def complete_validated(self, validate, request: dict, content: str = None):
+        """ Calls complete(**request) and returns validate(reply). A reply that fails
+        validation is retried one model tier up. On the last tier an IncompleteReply
+        still returns its partial result; any other ValueError is raised. `content`
+        is a first-tier reply already obtained, e.g. from complete_many. """
+        call_site = request.get("call_site")
+        tiers = self.router.tiers(call_site) if self.router is not None else 1
+        for tier in range(tiers):
+            if content is None or tier > 0:
+                content = self.complete(**request, tier=tier)
+            try:
+                result = validate(content)
+            except ValueError as e:
+                if tier < tiers - 1:
+                    logging.info(f"Escalating {call_site} from {self.route(call_site, request['model'], tier)}: {str(e)}")
+                    continue
+                if self.router is not None:
+                    self.router.record(call_site, tier, valid=False)
+                if isinstance(e, IncompleteReply):
+                    return e.result
+                raise
+            if self.router is not None:
+                self.router.record(call_site, tier)
+            return result
+
+    def route(self, call_site: str, model: str, tier: int = 0) -> str:
+        if self.router is None:
+            return model
+        return self.router.model(call_site, model, tier)
+
+    def _slot(self, priority: int, owner):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(priority, owner)
+
+    @asynccontextmanager
+    async def _aslot(self, priority: int, owner):
+        if self.scheduler is None:
+            yield
+            return
+        async with self.scheduler.aslot(priority, owner):
+            yield
+
+    def start_run(self, owner, label: str = "") -> str:
+        """ Starts a metrics run for the calls of owner; returns its id, or None without metrics. """
+        if self.metrics is None:
+            return None
+        run_id = self.metrics.start_run(label)
+        self._runs[owner] = run_id
+        return run_id
+
+    def end_run(self, owner) -> None:
+        self._runs.pop(owner, None)
+
+    @contextmanager
+    def owned_by(self, owner):
+        """ Calls made on this thread inside the block count for owner's run. """
+        previous = getattr(self._local, "owner", None)
+        self._local.owner = owner
+        try:
+            yield
+        finally:
+            self._local.owner = previous
+
+    def current_owner(self):
+        return getattr(self._local, "owner", None)
+
+    def cancel_pending(self, owner) -> int:
+        """ Cancels an owner's calls still waiting for a scheduler slot, and any it makes
+        later, until reset_owner(owner). """
+        if self.scheduler is None:
+            return 0
+        return self.scheduler.cancel(owner)
+
+    def reset_owner(self, owner) -> None:
+        if self.scheduler is not None:
+            self.scheduler.reset(owner)
+
+    def _cache_lookup(self, messages, model, temperature, use_cache, kwargs) -> tuple[str, str, str]:
+        if self.cache is None:
+            return None, None, CACHE_OFF
+        key = self.cache.make_key(model, messages, temperature, **kwargs)
+        if not use_cache:
+            self.cache.record_bypass()
+            return key, None, CACHE_BYPASS
+        cached = self.cache.get(key)
+        return key, cached, CACHE_HIT if cached is not None else CACHE_MISS
+
+    def _cache_store(self, key, model, content) -> None:
+        if key is not None and content is not None:
+            self.cache.store(key, model, content)
+
+    def _record(self, call_site, job_id, model, cache_status, messages, content, response=None, latency=0.0,
+                owner=None) -> None:
+        if self.metrics is None:
+            return
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.total_tokens:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            # Cache hits (and servers that report no usage) are sized from the text
+            prompt_tokens, completion_tokens = estimate_tokens(messages), estimate_tokens(content or "")
+        # Calls made without an owner count for the run of the thread they were made on
+        run_id = self._runs.get(owner if owner is not None else self.current_owner())
+        self.metrics.record(call_site, model, cache_status, prompt_tokens, completion_tokens, latency, job_id, run_id)
+
+    def _buckets(self, priority: int) -> tuple[TokenBucket, TokenBucket]:
+        if priority == INTERACTIVE:
+            return self.interactive_requests_bucket, self.interactive_tokens_bucket
+        return self.requests_bucket, self.tokens_bucket
+
+    def _debt_delay(self, priority: int) -> float:
+        """ How long a non-interactive call waits before booking, so that bulk work never
+        books more than MAX_BULK_DEBT seconds ahead of its buckets. """
+        if priority == INTERACTIVE:
+            return 0.0
+        requests, tokens = self._buckets(priority)
+        return max(requests.debt_wait(MAX_BULK_DEBT), tokens.debt_wait(MAX_BULK_DEBT))
+
+    def _reserve(self, priority: int, estimate: int) -> float:
+        requests, tokens = self._buckets(priority)
+        return max(requests.reserve(), tokens.reserve(estimate))
+
+    def _throttle(self, priority: int, estimate: int) -> None:
+        time.sleep(self._debt_delay(priority))
+        time.sleep(self._reserve(priority, estimate))
+
+    def _settle_tokens(self, response, estimate, priority: int = BULK) -> None:
+        # Book the difference between the estimate and what the request really used
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.total_tokens:
+            self._buckets(priority)[1].reserve(usage.total_tokens - estimate)
+
+
+class IncompleteReply(ValueError):
+    """ A reply in the expected format that leaves required fields empty. """
+
+    def __init__(self, message: str, result) -> None:
+        super().__init__(message)
+        self.result = result
+
+
+def _retry_after(error: RateLimitError, attempt: int) -> float:
+    headers = error.response.headers if error.response is not None else {}
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    delay = parse_retry_after(headers.get("retry-after"))
+    return delay if delay is not None else 2 ** attempt
+
+
+def estimate_tokens(messages) -> int:
+    """ Rough token count of a prompt: about four characters per token. """
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    return sum(len(str(message.get("content", ""))) // 4 + 4 for message in messages)
+
+
+def categorize_description(agent: Agent, text: str, job_id: str = None) -> dict:
+
+    return agent.complete_validated(validate_description, dict(
+        call_site="categorize_description",
+        job_id=job_id,
         model="gpt-4-turbo",
         messages=[
             {
@@ -46,18 +365,18 @@ def categorize_description(agent: Agent, text: str) -> dict:
             },
         ],
         temperature=0.1,
-    )
-
-    return parse_description_to_dict(response.choices[0].message.content)
+    ))
 
 
-def get_parameters_from_raw_description(agent: Agent, raw_description: str) -> dict:
+def get_parameters_from_raw_description(agent: Agent, raw_description: str, job_id: str = None) -> dict:
 
     # print(
     #     f"Extracting parameters from the following job description:\n{raw_description}\n"
     # )
 
-    response = agent.client.chat.completions.create(
+    parameters = agent.complete_validated(validate_parameters, dict(
+        call_site="get_parameters_from_raw_description",
+        job_id=job_id,
         model="gpt-4-turbo",
         messages=[
             {
@@ -95,11 +414,156 @@ def get_parameters_from_raw_description(agent: Agent, raw_description: str) -> d
             },
         ],
         temperature=0.1,
+    ))
+
+    # print(f"Parameters found:\n{parameters}")
+
+    return parameters
+
+
+JOB_DETAIL_CATEGORIES = ("REQUIREMENTS", "PREFERENCES", "SKILLS")
+JOB_DETAIL_PARAMETERS = ("commitment", "location", "max_hourly_rate", "start_date", "end_date", "deadline")
+JOB_DETAIL_PARAMETER_HINTS = {
+    "commitment": "commitment (in hours per week)",
+    "location": "location (city, country)",
+    "max_hourly_rate": "max_hourly_rate (in EUR / hour [convert if necessary])",
+    "start_date": "start_date (job start date, formatted as DD/MM/YYYY)",
+    "end_date": "end_date (job end date, formatted as DD/MM/YYYY)",
+    "deadline": "deadline (application deadline, formatted as DD/MM/YYYY)",
+}
+
+
+def job_details_request(raw_params: str, description: str, job_id: str = None, parameters=JOB_DETAIL_PARAMETERS) -> dict:
+    """ Keyword arguments for Agent.complete / complete_many that extract the job details.
+    Only the given parameters are asked for; with none, the call only categorizes. """
+    if parameters:
+        hints = "\n".join(f"                    - {JOB_DETAIL_PARAMETER_HINTS[key]}" for key in parameters)
+        extraction = f"""
+                    2. Extract the following parameters from the posting details and description:
+{hints}
+                    IF ANY OF THE PARAMETERS ARE NOT PRESENT IN THE TEXT, USE null.\n
+"""
+        task = "Categorize the description and extract the parameters."
+    else:
+        extraction = ""
+        task = "Categorize the description."
+    fields = ", ".join(['"requirements": ["..."]', '"preferences": ["..."]', '"skills": ["..."]'] + [f'"{key}": "..."' for key in parameters])
+    return dict(
+        call_site="job_details",
+        job_id=job_id,
+        model="gpt-4-turbo",
+        response_format={"type": "json_object"},
+        messages=[
+            {
+                "role": "system",
+                "content": f"""
+                    You are an assistant designed to analyse a job posting.\n
+                    1. Categorize the job description into 3 distinct categories:
+                    - requirements (e.g. qualifications, experience, etc.)
+                    - preferences (e.g. wishes, desires, etc.)
+                    - skills (e.g. competencies, abilities, etc.)
+                    Be thorough in your categorization and ensure that you capture all relevant information.\n
+{extraction}
+                    RETURN A SINGLE JSON OBJECT EXACTLY OF THE FORM:
+                    {{{fields}}}\n
+
+                    The posting details are the following:\n
+                    {raw_params}\n
+                    The job description is the following:\n
+                    {description}\n
+                    """,
+            },
+            {
+                "role": "user",
+                "content": f"{task} Return only the JSON object.",
+            },
+        ],
+        temperature=0.1,
     )
 
-    # print(f"Parameters found:\n{response.choices[0].message.content}")
 
-    return parse_parameters_to_dict(response.choices[0].message.content)
+def extract_job_details(agent: Agent, raw_params: str, description: str, content: str = None, job_id: str = None,
+                        known: dict = None) -> dict:
+    """ Categorizes the description and extracts the job parameters in a single JSON-mode call.
+    Returns {"description": <categorize_description dict>, "parameters": <get_parameters_from_raw_description dict>}.
+    Parameters already `known` (e.g. read from the info block) are not asked for.
+    `content` is a reply already obtained for job_details_request, e.g. from complete_many. """
+    known = {key: value for key, value in (known or {}).items() if value is not None}
+    missing = missing_parameters(known)
+    request = job_details_request(raw_params, description, job_id, missing)
+    try:
+        details = agent.complete_validated(functools.partial(validate_job_details, parameters=missing), request, content)
+    except ValueError as e:
+        # Fall back to the two free-text prompts rather than losing the job
+        logging.warning(f"Invalid job details response, falling back to separate calls: {str(e)}")
+        details = {
+            "description": categorize_description(agent, description, job_id),
+            "parameters": get_parameters_from_raw_description(agent, raw_params + description, job_id) if missing else {},
+        }
+    details["parameters"] = {**details["parameters"], **known}
+    return details
+
+
+def missing_parameters(known: dict) -> list[str]:
+    return [key for key in JOB_DETAIL_PARAMETERS if known.get(key) is None]
+
+
+def parse_job_details(text: str, parameters=JOB_DETAIL_PARAMETERS) -> dict:
+    try:
+        data = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Response is not valid JSON: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+
+    description = {}
+    for category in JOB_DETAIL_CATEGORIES:
+        items = data.get(category.lower())
+        if items is None:
+            raise ValueError(f"Missing category '{category.lower()}'")
+        if isinstance(items, str):
+            items = items.split(",")
+        if not isinstance(items, list):
+            raise ValueError(f"Category '{category.lower()}' is not a list")
+        # Same comma-joined form parse_description_to_dict produces
+        description[category] = ", ".join(str(item).strip() for item in items if str(item).strip())
+
+    extracted = {}
+    for key in parameters:
+        value = data.get(key)
+        value = str(value).strip() if value is not None else ""
+        extracted[key] = None if value == "" or value.lower() == "null" else value
+
+    return {"description": description, "parameters": extracted}
+
+
+def validate_job_details(text: str, parameters=JOB_DETAIL_PARAMETERS) -> dict:
+    details = parse_job_details(text, parameters)
+    description = details["description"]
+    if not description["REQUIREMENTS"] and not description["SKILLS"]:
+        raise IncompleteReply("No requirements or skills extracted", details)
+    return details
+
+
+def validate_description(text: str) -> dict:
+    # The free-text parser always returns something, so every failure is a partial result
+    description = parse_description_to_dict(text)
+    missing = [category for category in JOB_DETAIL_CATEGORIES if category not in description]
+    if missing:
+        raise IncompleteReply(f"Missing categories {missing}", description)
+    if not any(description.values()):
+        raise IncompleteReply("All categories are empty", description)
+    return description
+
+
+def validate_parameters(text: str) -> dict:
+    parameters = parse_parameters_to_dict(text)
+    missing = [key for key in JOB_DETAIL_PARAMETERS if key not in parameters]
+    if missing:
+        raise IncompleteReply(f"Missing parameters {missing}", parameters)
+    if all(parameters[key] is None for key in JOB_DETAIL_PARAMETERS):
+        raise IncompleteReply("All parameters are empty", parameters)
+    return parameters
 
 
 def clean_text(text: str):
@@ -196,6 +660,12 @@ def get_id_from_name(name: str) -> str:
     return str(int(m.hexdigest(), 16))[0:12]
 
 
+def get_content_fingerprint(text: str) -> str:
+    # Case and whitespace changes alone do not count as a changed posting
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
 def get_base_path():
     if hasattr(sys, 'frozen'):
         # cx_Freeze sets the 'frozen' attribute